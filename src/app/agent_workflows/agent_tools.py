@@ -0,0 +1,74 @@
+import asyncio
+import re
+import statistics
+import time
+from collections import defaultdict
+from typing import Any
+
+from agents.agent import Agent
+from agents.run import RunContextWrapper, Runner
+from agents.tool import FunctionTool, function_tool
+
+# Agents used as tools by a manager agent. The SDK already runs the tool calls of one model turn concurrently, so
+# the manager is asked for parallel tool calls; these tools then share one concurrency budget across every
+# manager run, hand back only a compact final output, and record how long each call waited and ran.
+
+
+def compact(text: str, max_chars: int) -> str:
+    """ The final output of a nested run, trimmed of blank-line runs and capped at max_chars """
+    text = re.sub(r"\n{3,}", "\n\n", text.strip())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "\n[truncated]"
+
+
+class AgentToolPool:
+    def __init__(self, max_concurrency: int = 8, max_output_chars: int = 4000):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_output_chars = max_output_chars
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.waits: dict[str, list[float]] = defaultdict(list)
+
+    def tool(self, agent: Agent, tool_name: str, tool_description: str) -> FunctionTool:
+        """ Like agent.as_tool, with the nested run held to the pool's budget """
+
+        @function_tool(name_override=tool_name, description_override=tool_description)
+        async def run_agent(ctx: RunContextWrapper[Any], input: str) -> str:
+            """
+            Args:
+                input: The input for the agent.
+            """
+            queued = time.monotonic()
+            async with self.semaphore:
+                start = time.monotonic()
+                self.waits[tool_name].append(start - queued)
+                try:
+                    # The nested run gets only the tool input, and the run config (e.g. the model provider) of the
+                    # manager's run
+                    result = await Runner.run(
+                        agent, input, context=ctx.context, run_config=getattr(ctx, "run_config", None)
+                    )
+                finally:
+                    self.latencies[tool_name].append(time.monotonic() - start)
+            return compact(str(result.final_output), self.max_output_chars)
+
+        return run_agent
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {
+            name: {
+                "calls": len(latencies),
+                "p50": statistics.median(latencies),
+                "max": max(latencies),
+                "wait_max": max(self.waits[name]),
+            }
+            for name, latencies in self.latencies.items()
+        }
+
+    def report(self) -> str:
+        lines = [f"{'tool':<16}{'calls':>7}{'p50 s':>9}{'max s':>9}{'wait s':>9}"]
+        for name, stats in sorted(self.stats().items()):
+            lines.append(
+                f"{name:<16}{stats['calls']:>7}{stats['p50']:>9.2f}{stats['max']:>9.2f}{stats['wait_max']:>9.2f}"
+            )
+        return "\n".join(lines)
@@ -128,4 +128,5 @@ async def run_agent_with_invalid_extraction():
         print(e)
         print(f"Agent framework caught the issue: {type(e).__name__}")
 
-asyncio.run(run_agent_with_valid_extraction())
+if __name__ == "__main__":
+    asyncio.run(run_agent_with_valid_extraction())
@@ -1,4 +1,5 @@
 import asyncio
+import re
 
 from pydantic import BaseModel
 from agents.agent import Agent
@@ -7,34 +8,73 @@ from agents.run import Runner, RunContextWrapper
 from agents.items import TResponseInputItem
 from agents.exceptions import InputGuardrailTripwireTriggered, OutputGuardrailTripwireTriggered
 
+from src.app.agent_workflows.guardrail_tiers import Prefilter, TieredGuardrail, input_text
 from src.app.settings import get_settings
 
 settings = get_settings()
 
+# An arithmetic expression followed by "=" and its result or a question mark, e.g. "2+2=4" or "3 * 4 = ?", but not a
+# phone number with a note such as "555-1234 = urgent"
+EQUATION = re.compile(r"\d+(\.\d+)?\s*[-+*/×÷^]\s*\d+(\.\d+)?\s*=\s*(-?\d|\?)")
+# A question that is only an arithmetic expression, e.g. "What is 2+2?" or "calculate 3 x 4"; the expression has to
+# end the clause, so "What is 24/7 support?" and "What is the 1-800 number for support?" are left to the model
+ARITHMETIC_QUESTION = re.compile(
+    r"\b(what is|what's|calculate|compute|evaluate)\s+-?\d+(\.\d+)?\s*[-+*/×÷^x]\s*-?\d+(\.\d+)?\s*([?!=]|\.(?!\d)|$)",
+    re.I,
+)
+SOLVE = re.compile(r"\b(solve|simplify|differentiate|integrate)\b[^.?!]*(\bequation\b|\bfor [a-z]\b|=)", re.I)
+
+# Obvious math homework trips the input guardrail without a model call, and a request with no numbers or math
+# vocabulary at all passes it; only what is in between is classified by the guardrail agent.
+MATH_HOMEWORK_PREFILTER = Prefilter(
+    block=[
+        ARITHMETIC_QUESTION,
+        EQUATION,
+        SOLVE,
+        re.compile(r"\bmath(s|ematics)? homework\b", re.I),
+    ],
+    topic=[
+        re.compile(r"\d"),
+        re.compile(
+            r"\b(math|maths|algebra|calculus|geometry|equation|sum|product|plus|minus|times|divided|square|root|"
+            r"fraction|percent|derivative|integral|probability|solve|calculate|compute|homework)\w*\b",
+            re.I,
+        ),
+    ],
+)
+
 # This is an example of how to use the input guardrail to prevent the agent from doing math homework. The guardrail checks if the user is asking the agent to do their math homework, and if so, it trips a tripwire and prevents the agent from answering the question.
 class MathHomeworkOutput(BaseModel):
     is_math_homework: bool
     reasoning: str
 
-guardrail_agent = Agent( 
+homework_check_agent = Agent(
     name="Guardrail check",
     instructions="Check if the user is asking you to do their math homework.",
     output_type=MathHomeworkOutput,
     model=settings.openai_model
 )
 
-@input_guardrail
-async def math_guardrail( 
-    ctx: RunContextWrapper[None], agent: Agent, input: str | list[TResponseInputItem]
-) -> GuardrailFunctionOutput:
-    result = await Runner.run(guardrail_agent, input, context=ctx.context)
+async def classify_math_homework(ctx: RunContextWrapper, text: str) -> GuardrailFunctionOutput:
+    result = await Runner.run(homework_check_agent, text, context=ctx.context)
 
     return GuardrailFunctionOutput(
-        output_info=result.final_output, 
+        output_info=result.final_output,
         tripwire_triggered=result.final_output.is_math_homework,
     )
 
-agent = Agent(  
+math_homework_check = TieredGuardrail(
+    "math_homework", classify_math_homework, MATH_HOMEWORK_PREFILTER, cache_size=settings.guardrail_cache_max_entries
+)
+
+# The SDK runs input guardrails alongside the agent's model call by default, cancelling the call on a tripwire
+@input_guardrail
+async def math_guardrail(
+    ctx: RunContextWrapper[None], agent: Agent, input: str | list[TResponseInputItem]
+) -> GuardrailFunctionOutput:
+    return await math_homework_check(ctx, input_text(input))
+
+support_agent = Agent(
     name="Customer support agent",
     instructions="You are a customer support agent. You help customers with their questions.",
     input_guardrails=[math_guardrail],
@@ -44,44 +84,55 @@ agent = Agent(
 async def run_agent_with_input_guardrail():
     # This should trip the guardrail
     try:
-        output = await Runner.run(agent, "What is 2+2?")
+        output = await Runner.run(support_agent, "What is 2+2?")
         print("Guardrail didn't trip")
         print(output.final_output)
 
     except InputGuardrailTripwireTriggered:
         print("Math homework guardrail tripped. You are not allowed to ask the agent to do your math homework!")
 
-    
+
 # This is an example of how to use the output guardrail to prevent the agent from doing math homework. The guardrail checks if the agent's output includes any math, and if so, it trips a tripwire and prevents the agent from answering the question.
-class MessageOutput(BaseModel): 
+class MessageOutput(BaseModel):
     response: str
 
-class MathOutput(BaseModel): 
+class MathOutput(BaseModel):
     reasoning: str
     is_math: bool
 
-guardrail_agent = Agent(
+math_check_agent = Agent(
     name="Guardrail check",
     instructions="Check if the output includes any math.",
     output_type=MathOutput,
     model=settings.openai_model
 )
 
-@output_guardrail
-async def math_guardrail(  
-    ctx: RunContextWrapper, agent: Agent, output: MessageOutput
-) -> GuardrailFunctionOutput:
-    result = await Runner.run(guardrail_agent, output.response, context=ctx.context)
+async def classify_math(ctx: RunContextWrapper, text: str) -> GuardrailFunctionOutput:
+    result = await Runner.run(math_check_agent, text, context=ctx.context)
 
     return GuardrailFunctionOutput(
         output_info=result.final_output,
         tripwire_triggered=result.final_output.is_math,
     )
 
-agent = Agent( 
+# Answers are judged on what they contain, e.g. "The answer is four." has no digits but is still math, so there is
+# no local pass here: only worked equations are decided locally, everything else goes to the model
+MATH_OUTPUT_PREFILTER = Prefilter(block=[EQUATION, SOLVE])
+
+math_output_check = TieredGuardrail(
+    "math_output", classify_math, MATH_OUTPUT_PREFILTER, cache_size=settings.guardrail_cache_max_entries
+)
+
+@output_guardrail
+async def math_output_guardrail(
+    ctx: RunContextWrapper, agent: Agent, output: MessageOutput
+) -> GuardrailFunctionOutput:
+    return await math_output_check(ctx, output.response)
+
+structured_support_agent = Agent(
     name="Customer support agent",
     instructions="You are a customer support agent. You help customers with their questions.",
-    output_guardrails=[math_guardrail],
+    output_guardrails=[math_output_guardrail],
     output_type=MessageOutput,
     model=settings.openai_model
 )
@@ -89,11 +140,12 @@ agent = Agent(
 async def run_agent_with_output_guardrail():
     # This should trip the guardrail
     try:
-        output = await Runner.run(agent, "What is 2+2?")
+        output = await Runner.run(structured_support_agent, "What is 2+2?")
         print("Guardrail didn't trip")
         print(output.final_output)
 
     except OutputGuardrailTripwireTriggered:
         print("Math homework guardrail tripped. Agent is not allowed to do math homework!")
 
-asyncio.run(run_agent_with_output_guardrail())
+if __name__ == "__main__":
+    asyncio.run(run_agent_with_output_guardrail())
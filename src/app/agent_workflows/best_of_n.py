@@ -0,0 +1,123 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Literal, Optional
+
+from agents.agent import Agent
+from agents.run import RunConfig, Runner
+from pydantic import BaseModel, Field
+
+# Best-of-N: every candidate agent runs at once, and a knockout tournament judges them pairwise as they finish, so
+# judging overlaps with the slower candidates instead of waiting for all of them. At the deadline the stragglers
+# and any undecided matches are dropped, and the picker chooses among the surviving candidates only.
+
+
+class PairwiseChoice(BaseModel):
+    better: Literal["A", "B"] = Field(description="The better of the two options, A or B.")
+
+
+@dataclass
+class Candidate:
+    agent_name: str
+    output: str
+    elapsed: float
+
+
+@dataclass
+class BestOfNResult:
+    winner: str
+    candidates: list[Candidate] = field(default_factory=list)
+    survivors: list[Candidate] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+    judge_calls: int = 0
+    elapsed: float = 0.0
+
+
+def pairwise_input(a: Candidate, b: Candidate) -> str:
+    return f"Option A:\n\n{a.output}\n\nOption B:\n\n{b.output}"
+
+
+def picker_input(candidates: list[Candidate]) -> str:
+    return "Options:\n\n" + "\n\nOption:\n\n".join(candidate.output for candidate in candidates)
+
+
+async def best_of_n(
+    agents: list[Agent],
+    input: str,
+    judge: Agent,
+    picker: Optional[Agent] = None,
+    deadline: Optional[float] = None,
+    run_config: Optional[RunConfig] = None,
+) -> BestOfNResult:
+    """ Run the agents on the same input and return the best of their outputs
+
+    judge compares two outputs and must have PairwiseChoice as its output type. picker, given the survivors as
+    picker_input, replies with the chosen one; it only runs when the deadline (seconds) leaves more than one
+    undecided. Without a picker the tournament plays on past the deadline among the candidates that made it.
+    """
+    start = time.monotonic()
+    deadline_at = None if deadline is None else start + deadline
+    result = BestOfNResult(winner="")
+    generating: dict[asyncio.Task, Agent] = {
+        asyncio.create_task(Runner.run(agent, input, run_config=run_config)): agent for agent in agents
+    }
+    matches: dict[asyncio.Task, tuple[Candidate, Candidate]] = {}
+    pool: list[Candidate] = []
+
+    async def play(a: Candidate, b: Candidate) -> Candidate:
+        result.judge_calls += 1
+        verdict = await Runner.run(judge, pairwise_input(a, b), run_config=run_config)
+        return a if verdict.final_output_as(PairwiseChoice).better == "A" else b
+
+    try:
+        while generating or matches:
+            remaining = None if deadline_at is None else deadline_at - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                if pool or matches:
+                    break
+                # Nothing has finished yet, so wait for the first candidate however late it is
+                remaining = None
+            done, _ = await asyncio.wait(
+                set(generating) | set(matches), timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task in generating:
+                    agent = generating.pop(task)
+                    if task.exception() is not None:
+                        print(f"Candidate from {agent.name} failed: {task.exception()!r}")
+                        continue
+                    candidate = Candidate(agent.name, str(task.result().final_output), time.monotonic() - start)
+                    result.candidates.append(candidate)
+                    pool.append(candidate)
+                else:
+                    a, b = matches.pop(task)
+                    if task.exception() is not None:
+                        # A failed comparison keeps the earlier candidate rather than losing both
+                        print(f"Judging {a.agent_name} against {b.agent_name} failed: {task.exception()!r}")
+                        pool.append(a)
+                    else:
+                        pool.append(task.result())
+            while len(pool) >= 2:
+                a, b = pool.pop(0), pool.pop(0)
+                matches[asyncio.create_task(play(a, b))] = (a, b)
+    finally:
+        for task in generating:
+            task.cancel()
+            result.dropped.append(generating[task].name)
+        for task, (a, b) in matches.items():
+            task.cancel()
+            pool.extend((a, b))
+        await asyncio.gather(*generating, *matches, return_exceptions=True)
+
+    if not pool:
+        raise RuntimeError("No candidate finished")
+    result.survivors = list(pool)
+    if len(pool) > 1 and picker is not None:
+        picked = await Runner.run(picker, picker_input(pool), run_config=run_config)
+        result.winner = str(picked.final_output)
+    else:
+        while len(pool) > 1:
+            pool.append(await play(pool.pop(0), pool.pop(0)))
+        result.winner = pool[0].output
+    result.elapsed = time.monotonic() - start
+    return result
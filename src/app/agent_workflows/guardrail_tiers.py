@@ -0,0 +1,124 @@
+import asyncio
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from agents.guardrail import GuardrailFunctionOutput
+from agents.items import TResponseInputItem
+from agents.run import RunContextWrapper
+
+# Guardrails decide cheapest first: a local pre-filter settles the obvious inputs, a cache of earlier verdicts the
+# repeated ones, and only what is left goes to the guardrail's model. Concurrent checks of the same input share a
+# single model call, which finishes (and is cached) even when the run that started it is cancelled.
+
+
+def normalise(text: str) -> str:
+    """ The cache key of an input: case, surrounding punctuation and runs of whitespace don't change a verdict """
+    return re.sub(r"\s+", " ", text).strip().strip(".!?").strip().lower()
+
+
+def input_text(input: str | list[TResponseInputItem]) -> str:
+    """ The text of the user's messages in a guardrail's input """
+    if isinstance(input, str):
+        return input
+    parts = []
+    for item in input:
+        if not isinstance(item, dict) or item.get("role", "user") != "user":
+            continue
+        content = item.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+    return "\n".join(parts)
+
+
+@dataclass
+class Prefilter:
+    """ Local first tier: trips on any block pattern, passes when none of the topic patterns match at all, and leaves
+    everything else undecided for the model """
+
+    block: list[re.Pattern] = field(default_factory=list)
+    topic: list[re.Pattern] = field(default_factory=list)
+
+    def decide(self, text: str) -> Optional[tuple[bool, str]]:
+        for pattern in self.block:
+            if pattern.search(text):
+                return True, f"matched {pattern.pattern!r}"
+        if self.topic and not any(pattern.search(text) for pattern in self.topic):
+            return False, "nothing related to the guarded topic"
+        return None
+
+
+class VerdictCache:
+    """ LRU cache of guardrail verdicts by normalised input """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, GuardrailFunctionOutput] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[GuardrailFunctionOutput]:
+        verdict = self.entries.get(key)
+        if verdict is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return verdict
+
+    def put(self, key: str, verdict: GuardrailFunctionOutput) -> None:
+        self.entries[key] = verdict
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+Classifier = Callable[[RunContextWrapper, str], Awaitable[GuardrailFunctionOutput]]
+
+
+class TieredGuardrail:
+    """ A guardrail check going through the pre-filter, then the verdict cache, then classify (the model call) """
+
+    def __init__(self, name: str, classify: Classifier, prefilter: Optional[Prefilter] = None, cache_size: int = 1024):
+        self.name = name
+        self.classify = classify
+        self.prefilter = prefilter
+        self.cache = VerdictCache(cache_size)
+        self.in_flight: dict[str, asyncio.Task] = {}
+        self.decided_by = {"prefilter": 0, "cache": 0, "model": 0, "shared": 0}
+
+    async def __call__(self, ctx: RunContextWrapper, text: str) -> GuardrailFunctionOutput:
+        if self.prefilter is not None and (decision := self.prefilter.decide(text)) is not None:
+            tripped, reason = decision
+            self.decided_by["prefilter"] += 1
+            return GuardrailFunctionOutput(
+                output_info={"guardrail": self.name, "tier": "prefilter", "reason": reason},
+                tripwire_triggered=tripped,
+            )
+
+        key = normalise(text)
+        if (verdict := self.cache.get(key)) is not None:
+            self.decided_by["cache"] += 1
+            return verdict
+
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self.classify(ctx, text))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.settle(key, done))
+            self.decided_by["model"] += 1
+        else:
+            self.decided_by["shared"] += 1
+        # Shielded, so a run cancelled by another guardrail's tripwire leaves the check to finish for the cache
+        return await asyncio.shield(task)
+
+    def settle(self, key: str, task: asyncio.Task) -> None:
+        self.in_flight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.cache.put(key, task.result())
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.decided_by, "cache_entries": len(self.cache.entries), "in_flight": len(self.in_flight)}
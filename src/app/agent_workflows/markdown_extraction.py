@@ -0,0 +1,219 @@
+"""Structured extraction of markdown documents into MarkdownExtraction, with the model as the fallback.
+
+Well-formed documents (one "# " title, an "Author:" line and "## " sections with content) are parsed locally, without
+any model call. Anything else goes to the extractor agent with a lenient output type, and the result is validated
+here; when fields fail validation, only those fields are sent back to the model to be repaired.
+
+    python -m src.app.agent_workflows.markdown_extraction docs/ --output extractions.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import textwrap
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from agents.agent import Agent
+from agents.run import RunConfig, Runner
+from pydantic import BaseModel, Field, ValidationError
+
+from src.app.agent_workflows.agent_with_custom_validation import MarkdownExtraction
+from src.app.agent_workflows.agent_with_custom_validation import agent as extraction_agent
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+TITLE = re.compile(r"^#\s+(.+?)\s*#*$")
+SECTION = re.compile(r"^##\s+(.+?)\s*#*$")
+FENCE = re.compile(r"^(`{3,}|~{3,})")
+METADATA = re.compile(r"^\**(author|by|date)\**\s*:\s*\**\s*(.+?)\s*$", re.I)
+
+
+# The extractor's output type without the validators, so a near miss comes back as data to repair rather than as an
+# error from the SDK
+class LenientSection(BaseModel):
+    heading: str
+    content: str
+
+
+class LenientMetadata(BaseModel):
+    author: str
+    date: str | None
+
+
+class LenientExtraction(BaseModel):
+    title: str
+    sections: list[LenientSection]
+    metadata: LenientMetadata
+
+
+class FieldFix(BaseModel):
+    path: str = Field(description="The path of the field, exactly as given, e.g. sections.1.content")
+    value_json: str = Field(description="The corrected value of the field, as JSON")
+
+
+class FieldFixes(BaseModel):
+    fixes: list[FieldFix]
+
+
+lenient_extraction_agent = extraction_agent.clone(output_type=LenientExtraction)
+
+repair_agent = Agent(
+    name="Markdown extraction repairer",
+    instructions="""You correct fields of a structured extraction of a markdown document that failed validation.
+    You are given the document and, for each failing field, its path, its current value and the validation error.
+    Reply with a corrected value for every listed field, taken from the document, and nothing else.
+    Text fields must not be empty, and sections must contain at least one section with a heading and content.""",
+    output_type=FieldFixes,
+    model=settings.openai_model,
+)
+
+
+@dataclass
+class ExtractionResult:
+    extraction: MarkdownExtraction
+    method: str  # "local", "model" or "repaired"
+    repairs: int = 0
+
+
+def parse_markdown(text: str) -> Optional[MarkdownExtraction]:
+    """ Extract a well-formed document locally, or None when it needs the model """
+    title = None
+    metadata: dict[str, str] = {}
+    sections: list[dict[str, Any]] = []
+    fence = None
+    for line in textwrap.dedent(text).strip().splitlines():
+        stripped = line.strip()
+        if fence is not None:
+            # Inside a code block everything is content, headings included, up to the closing fence
+            sections[-1]["lines"].append(line.rstrip())
+            if re.fullmatch(rf"{re.escape(fence[0])}{{{len(fence)},}}", stripped):
+                fence = None
+        elif (match := FENCE.match(stripped)) is not None:
+            if not sections:
+                return None
+            fence = match.group(1)
+            sections[-1]["lines"].append(line.rstrip())
+        elif (match := SECTION.match(stripped)) is not None:
+            sections.append({"heading": match.group(1), "lines": []})
+        elif (match := TITLE.match(stripped)) is not None:
+            if title is not None:
+                # A second top-level heading: not a single document we can be sure about
+                return None
+            title = match.group(1)
+        elif sections:
+            sections[-1]["lines"].append(line.rstrip())
+        elif (match := METADATA.match(stripped)) is not None:
+            metadata["date" if match.group(1).lower() == "date" else "author"] = match.group(2)
+        elif stripped:
+            # Prose between the title and the first section
+            return None
+
+    if fence is not None or title is None or "author" not in metadata or not sections:
+        return None
+    try:
+        return MarkdownExtraction.model_validate(
+            {
+                "title": title,
+                "sections": [
+                    {"heading": section["heading"], "content": "\n".join(section["lines"])} for section in sections
+                ],
+                "metadata": metadata,
+            }
+        )
+    except ValidationError:
+        return None
+
+
+def get_path(data: Any, path: tuple) -> Any:
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def set_path(data: Any, path: list[str], value: Any) -> None:
+    *parents, last = [int(key) if key.isdigit() else key for key in path]
+    for key in parents:
+        data = data[key]
+    data[last] = value
+
+
+def repair_input(text: str, data: dict[str, Any], error: ValidationError) -> str:
+    failures = []
+    for detail in error.errors():
+        path = tuple(detail["loc"])
+        current = json.dumps(get_path(data, path))
+        failures.append(f"- {'.'.join(str(key) for key in path)} (currently {current}): {detail['msg']}")
+    return f"Document:\n{text}\n\nFailing fields:\n" + "\n".join(failures)
+
+
+async def extract(
+    text: str, run_config: Optional[RunConfig] = None, max_repairs: int = settings.extraction_max_repairs
+) -> ExtractionResult:
+    """ Extract a markdown document, locally when possible; raises the last ValidationError once repairs run out """
+    if (extraction := parse_markdown(text)) is not None:
+        return ExtractionResult(extraction, "local")
+
+    result = await Runner.run(lenient_extraction_agent, text, run_config=run_config)
+    data = result.final_output_as(LenientExtraction).model_dump()
+    for repairs in range(max_repairs + 1):
+        try:
+            return ExtractionResult(MarkdownExtraction.model_validate(data), "repaired" if repairs else "model", repairs)
+        except ValidationError as e:
+            if repairs == max_repairs:
+                raise
+            error = e
+        result = await Runner.run(repair_agent, repair_input(text, data, error), run_config=run_config)
+        for fix in result.final_output_as(FieldFixes).fixes:
+            try:
+                set_path(data, fix.path.split("."), json.loads(fix.value_json))
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                print(f"Skipping unusable fix for {fix.path}: {e!r}")
+
+
+async def extract_directory(
+    directory: Path, output: Path, concurrency: int = settings.extraction_concurrency
+) -> dict[str, int]:
+    """ Extract every markdown file under directory concurrently, writing one JSON line per file """
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"local": 0, "model": 0, "repaired": 0, "failed": 0}
+
+    async def extract_file(path: Path) -> dict[str, Any]:
+        async with semaphore:
+            text = await asyncio.to_thread(path.read_text, encoding="utf-8")
+            try:
+                result = await extract(text)
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Failed to extract {path}: {e}")
+                return {"path": str(path), "error": str(e)}
+        counts[result.method] += 1
+        return {
+            "path": str(path),
+            "method": result.method,
+            "repairs": result.repairs,
+            "extraction": result.extraction.model_dump(),
+        }
+
+    paths = sorted(directory.rglob("*.md"))
+    with output.open("w", encoding="utf-8") as f:
+        for record in asyncio.as_completed([extract_file(path) for path in paths]):
+            f.write(json.dumps(await record) + "\n")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the structure of markdown files")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--output", type=Path, default=Path("extractions.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=settings.extraction_concurrency)
+    args = parser.parse_args()
+
+    counts = asyncio.run(extract_directory(args.directory, args.output, args.concurrency))
+    print(f"Extracted {sum(counts.values()) - counts['failed']} files: {counts}")
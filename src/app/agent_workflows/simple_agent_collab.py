@@ -2,10 +2,13 @@ import asyncio
 from typing import Dict
 
 from agents.agent import Agent
-from agents.run import Runner
+from agents.model_settings import ModelSettings
+from agents.run import RunConfig, Runner
 from agents.tool import function_tool
 from agents.tracing import trace
 
+from src.app.agent_workflows.agent_tools import AgentToolPool
+from src.app.agent_workflows.best_of_n import PairwiseChoice, best_of_n
 from src.app.settings import get_settings
 
 settings = get_settings()
@@ -46,23 +49,34 @@ Do not give an explanation; reply with the selected email only.",
 )
 
 
-async def run_agent_collaboration():
+sales_judge = Agent(
+    name="sales_judge",
+    instructions="You compare two cold sales emails, A and B. \
+Imagine you are a customer and choose the one you are most likely to respond to.",
+    model=settings.openai_model,
+    output_type=PairwiseChoice,
+)
+
+
+async def run_agent_collaboration(
+    run_config: RunConfig | None = None, deadline: float | None = settings.best_of_n_deadline or None
+):
     message = "Write a cold sales email"
 
+    # The judge compares drafts pairwise as they arrive; the picker only sees the drafts still undecided at the deadline
     with trace("Collaborative cold email"):
-        results = await asyncio.gather(
-            Runner.run(sales_agent1, message),
-            Runner.run(sales_agent2, message),
-            Runner.run(sales_agent3, message),
+        result = await best_of_n(
+            [sales_agent1, sales_agent2, sales_agent3],
+            message,
+            judge=sales_judge,
+            picker=sales_picker,
+            deadline=deadline,
+            run_config=run_config,
         )
 
-    outputs = [result.final_output for result in results]
-
-    emails = "Cold sales emails:\n\n" + "\n\nEmail:\n\n".join(outputs)
-
-    picker_result = await Runner.run(sales_picker, emails)
-
-    print(f"Best sales email:\n{picker_result.final_output}")
+    if result.dropped:
+        print(f"Dropped the drafts still running at the deadline: {', '.join(result.dropped)}")
+    print(f"Best sales email:\n{result.winner}")
 
 
 # Part 2 - Use of tools in agents
@@ -70,9 +84,11 @@ async def run_agent_collaboration():
 description = "Write a cold sales email"
 
 # We can convert agents into tools and give them to other agents to use. This allows for more complex interactions and collaborations between agents, where they can call each other as tools to accomplish a task.
-tool1 = sales_agent1.as_tool(tool_name="sales_agent1", tool_description=description)
-tool2 = sales_agent2.as_tool(tool_name="sales_agent2", tool_description=description)
-tool3 = sales_agent3.as_tool(tool_name="sales_agent3", tool_description=description)
+# The pool runs them like agent.as_tool, but under one shared concurrency budget, with compact outputs and per-tool latency
+agent_tools = AgentToolPool(settings.agent_tool_concurrency, settings.agent_tool_max_output_chars)
+tool1 = agent_tools.tool(sales_agent1, tool_name="sales_agent1", tool_description=description)
+tool2 = agent_tools.tool(sales_agent2, tool_name="sales_agent2", tool_description=description)
+tool3 = agent_tools.tool(sales_agent3, tool_name="sales_agent3", tool_description=description)
 
 
 @function_tool
@@ -88,12 +104,12 @@ async def send_test_email(email_content: str) -> dict:
 tools = [tool1, tool2, tool3, send_test_email]
 
 
-async def run_master_agent_with_tools():
+async def run_master_agent_with_tools(run_config: RunConfig | None = None):
     instructions = """
         You are a Sales Manager at ComplAI. Your goal is to find the single best cold sales email using the sales_agent tools.
         
         Follow these steps carefully:
-        1. Generate Drafts: Use all three sales_agent tools to generate three different email drafts. Do not proceed until all three drafts are ready.
+        1. Generate Drafts: Call all three sales_agent tools together, in a single turn, to generate three different email drafts. Do not proceed until all three drafts are ready.
         
         2. Evaluate and Select: Review the drafts and choose the single best email using your judgment of which one is most effective.
         
@@ -109,12 +125,15 @@ async def run_master_agent_with_tools():
         instructions=instructions,
         tools=tools,
         model=settings.openai_model,
+        # Lets the model request the three drafts in one turn, which the SDK then runs concurrently
+        model_settings=ModelSettings(parallel_tool_calls=True),
     )
 
     message = "Send a cold sales email addressed to 'Dear CEO'"
 
     with trace("Sales manager"):
-        await Runner.run(sales_manager, message)
+        await Runner.run(sales_manager, message, run_config=run_config)
+    print(agent_tools.report())
 
 
 # Handoffs represent a way agent can delegate to another agent, passing control to it
@@ -127,7 +146,8 @@ subject_writer = Agent(
     instructions=subject_instructions,
     model=settings.openai_model,
 )
-subject_tool = subject_writer.as_tool(
+subject_tool = agent_tools.tool(
+    subject_writer,
     tool_name="subject_writer",
     tool_description="Write a subject for a cold sales email",
 )
@@ -140,13 +160,15 @@ html_converter = Agent(
     instructions=html_instructions,
     model=settings.openai_model,
 )
-html_tool = html_converter.as_tool(
+html_tool = agent_tools.tool(
+    html_converter,
     tool_name="html_converter",
     tool_description="Convert a text email body to an HTML email body",
 )
 
 instructions = "You are an email formatter and sender. You receive the body of an email to be sent. \
-You first use the subject_writer tool to write a subject for the email, then use the html_converter tool to convert the body to HTML. \
+You first use the subject_writer tool to write a subject for the email and the html_converter tool to convert the body to HTML, \
+calling both together in a single turn as neither needs the other's result. \
 Finally, you use the send_html_email tool to send the email with the subject and HTML body."
 
 
@@ -164,16 +186,17 @@ emailer_agent = Agent(
     instructions=instructions,
     tools=email_agent_tools,
     model=settings.openai_model,
+    model_settings=ModelSettings(parallel_tool_calls=True),
     handoff_description="Convert an email to HTML and send it",
 )
 
 
-async def run_master_agent_with_handoffs():
+async def run_master_agent_with_handoffs(run_config: RunConfig | None = None):
     sales_manager_instructions = """
         You are a Sales Manager at ComplAI. Your goal is to find the single best cold sales email using the sales_agent tools.
         
         Follow these steps carefully:
-        1. Generate Drafts: Use all three sales_agent tools to generate three different email drafts. Do not proceed until all three drafts are ready.
+        1. Generate Drafts: Call all three sales_agent tools together, in a single turn, to generate three different email drafts. Do not proceed until all three drafts are ready.
         
         2. Evaluate and Select: Review the drafts and choose the single best email using your judgment of which one is most effective.
         You can use the tools multiple times if you're not satisfied with the results from the first try.
@@ -193,16 +216,19 @@ async def run_master_agent_with_handoffs():
         tools=sales_manager_tools,
         handoffs=handoffs,
         model=settings.openai_model,
+        model_settings=ModelSettings(parallel_tool_calls=True),
     )
 
     message = "Send out a cold sales email addressed to Dear CEO from Alice"
 
     with trace("Automated SDR"):
-        result = await Runner.run(sales_manager, message)
+        result = await Runner.run(sales_manager, message, run_config=run_config)
         print(
             "Final output from Sales Manager (should be from Email Manager):",
             result.final_output,
         )
+    print(agent_tools.report())
 
 
-asyncio.run(run_master_agent_with_handoffs())
+if __name__ == "__main__":
+    asyncio.run(run_master_agent_with_handoffs())
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+
+@dataclass
+class Budget:
+    """ Token and dollar spend of a research run, checked against optional hard limits """
+
+    max_tokens: Optional[int] = None
+    max_dollars: Optional[float] = None
+    input_cost_per_million: float = 0.0
+    output_cost_per_million: float = 0.0
+    search_call_cost: float = 0.0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    search_calls: int = 0
+
+    def add(self, usage: Any) -> None:
+        """ Add the usage of an agent run (a RunResult's context_wrapper.usage) """
+        self.requests += usage.requests
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def price(self, input_tokens: int, output_tokens: int, search_calls: int = 0) -> float:
+        return (
+            input_tokens * self.input_cost_per_million / 1_000_000
+            + output_tokens * self.output_cost_per_million / 1_000_000
+            + search_calls * self.search_call_cost
+        )
+
+    @property
+    def dollars(self) -> float:
+        return self.price(self.input_tokens, self.output_tokens, self.search_calls)
+
+    @property
+    def exhausted(self) -> bool:
+        return (self.max_tokens is not None and self.tokens >= self.max_tokens) or (
+            self.max_dollars is not None and self.dollars >= self.max_dollars
+        )
+
+    def summary(self) -> str:
+        return f"{self.requests} requests, {self.tokens} tokens, {self.search_calls} searches, ${self.dollars:.4f}"
+
+
+class NoveltyTracker:
+    """ Marginal information gain of each new search summary, as its embedding distance to the closest one so far
+
+    Saturated once min_items summaries are in and the last patience ones each added less than threshold novelty.
+    """
+
+    def __init__(self, threshold: float = 0.1, patience: int = 2, min_items: int = 3):
+        self.threshold = threshold
+        self.patience = patience
+        self.min_items = min_items
+        self.vectors: list[np.ndarray] = []
+        self.low_streak = 0
+
+    def add(self, vector: np.ndarray) -> float:
+        """ Record a unit-length summary embedding, returning its novelty (1 - highest cosine similarity) """
+        novelty = 1.0 if not self.vectors else 1.0 - float(np.max(np.stack(self.vectors) @ vector))
+        self.vectors.append(vector)
+        self.low_streak = self.low_streak + 1 if novelty < self.threshold else 0
+        return novelty
+
+    @property
+    def saturated(self) -> bool:
+        return len(self.vectors) >= self.min_items and self.low_streak >= self.patience
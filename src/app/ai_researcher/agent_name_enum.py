@@ -3,6 +3,8 @@ from enum import Enum
 class AgentNames(Enum):
     RESEARCHER_AGENT = "ResearcherAgent"
     PLANNER_AGENT = "PlannerAgent"
+    RANKED_PLANNER_AGENT = "RankedPlannerAgent"
     SEARCH_AGENT = "SearchAgent"
     WRITER_AGENT = "WriterAgent"
+    REVISER_AGENT = "ReviserAgent"
     EMAIL_AGENT = "EmailAgent"
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""Run many research queries through ResearchManager, e.g. for nightly sweeps of hundreds of topics.
+
+Queries come from a JSONL file (objects with a "query" and optional "id", or bare strings) or a CSV file with a
+"query" column and optional "id" column. Queries run concurrently, and every agent call of every query shares one
+request/token rate limiter. Each query is checkpointed after every stage (plan, searches, report, email), so running
+the same command again after a crash resumes where it stopped. Results are appended to the output JSONL as each
+query finishes, and queries already in it are skipped.
+
+    cd src/app/ai_researcher
+    python batch.py topics.jsonl --output results.jsonl --concurrency 8 --email
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from agents.tracing import trace
+
+from fanout import FanOutConfig, fan_out
+from instrumentation import format_summary, get_tracer
+from planner_agent import WebSearchPlan
+from rate_limit import RateLimiter
+from research_manager import ResearchManager
+from writer_agent import ReportData
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+
+def query_id(query: str) -> str:
+    return hashlib.sha256(query.strip().encode()).hexdigest()[:16]
+
+
+def load_queries(path: Path) -> list[dict[str, str]]:
+    """ Read the queries of a JSONL or CSV file as {"id", "query"} dicts """
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            rows = [row for row in csv.DictReader(f)]
+    else:
+        with path.open(encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        rows = [{"query": row} if isinstance(row, str) else row for row in rows]
+
+    queries = []
+    for row in rows:
+        query = (row.get("query") or "").strip()
+        if query:
+            queries.append({"id": str(row.get("id") or query_id(query)), "query": query})
+    return queries
+
+
+class Checkpoint:
+    """ The completed stages of one query, as a JSON file written atomically after each stage """
+
+    def __init__(self, directory: Path, item_id: str):
+        self.path = directory / f"{item_id}.json"
+
+    def load(self) -> dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        return json.loads(self.path.read_text(encoding="utf-8"))
+
+    def save(self, state: dict[str, Any]) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        output: Path,
+        checkpoint_dir: Path,
+        concurrency: int = settings.research_batch_concurrency,
+        send_email: bool = False,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        self.output = output
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.concurrency = concurrency
+        self.send_email = send_email
+        self.rate_limiter = rate_limiter or RateLimiter(
+            requests_per_minute=settings.research_requests_per_minute,
+            tokens_per_minute=settings.research_tokens_per_minute,
+        )
+
+    def completed_ids(self) -> set[str]:
+        if not self.output.exists():
+            return set()
+        with self.output.open(encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return {record["id"] for record in records if record.get("status") == "ok"}
+
+    def write(self, record: dict[str, Any]) -> None:
+        # One line per finished query, flushed straight away so a crash loses nothing already done
+        with self.output.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    async def run_query(self, item: dict[str, str]) -> dict[str, Any]:
+        """ Research one query, skipping the stages its checkpoint says are already done """
+        checkpoint = Checkpoint(self.checkpoint_dir, item["id"])
+        state = checkpoint.load()
+        query = item["query"]
+        # The staged flow: nobody is watching a batch, so pipelining and streaming would only add LLM calls
+        manager = ResearchManager(pipelined=False, rate_limiter=self.rate_limiter)
+
+        with trace(f"Research batch {item['id']}"), manager.tracer.span(
+            "research", **{"research.query": query, "research.mode": "batch", "research.batch_id": item["id"]}
+        ):
+            if "plan" in state:
+                search_plan = WebSearchPlan.model_validate(state["plan"])
+            else:
+                search_plan = await manager.plan_searches(query)
+                state["plan"] = search_plan.model_dump()
+                checkpoint.save(state)
+
+            if "search_results" not in state:
+                state["search_results"] = await manager.perform_searches(search_plan)
+                checkpoint.save(state)
+
+            if "report" in state:
+                report = ReportData.model_validate(state["report"])
+            else:
+                report = await manager.write_report(query, state["search_results"])
+                state["report"] = report.model_dump()
+                checkpoint.save(state)
+
+            if self.send_email and not state.get("emailed"):
+                await manager.send_email(report)
+                state["emailed"] = True
+                checkpoint.save(state)
+
+        return {
+            "id": item["id"],
+            "query": query,
+            "status": "ok",
+            **report.model_dump(),
+            "searches": len(search_plan.searches),
+            "usage": {
+                "requests": manager.budget.requests,
+                "tokens": manager.budget.tokens,
+                "dollars": round(manager.budget.dollars, 6),
+            },
+        }
+
+    async def run(self, queries: list[dict[str, str]]) -> None:
+        done = self.completed_ids()
+        todo = [item for item in queries if item["id"] not in done]
+        print(f"{len(queries)} queries, {len(queries) - len(todo)} already done, running {len(todo)}")
+
+        start = time.perf_counter()
+        num_failed = 0
+        config = FanOutConfig(concurrency=self.concurrency, timeout=settings.research_batch_query_timeout, retries=0)
+        async for result in fan_out(todo, self.run_query, config):
+            if result.ok:
+                self.write(result.value)
+                Checkpoint(self.checkpoint_dir, result.item["id"]).remove()
+                print(f"Finished {result.item['id']} in {result.elapsed:.0f}s: {result.item['query']}")
+            else:
+                num_failed += 1
+                # The checkpoint stays, so the next run picks the query up from its last completed stage
+                self.write(
+                    {"id": result.item["id"], "query": result.item["query"], "status": "error", "error": repr(result.error)}
+                )
+                print(f"Failed {result.item['id']}: {result.error!r}")
+
+        print(
+            f"Batch finished in {time.perf_counter() - start:.0f}s: {len(todo) - num_failed} succeeded, "
+            f"{num_failed} failed, {self.rate_limiter.waited:.0f}s spent waiting on rate limits"
+        )
+        print(f"Stage latencies:\n{format_summary(get_tracer().summary())}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a batch of research queries")
+    parser.add_argument("queries", type=Path, help="JSONL or CSV file of queries")
+    parser.add_argument("--output", type=Path, default=Path("research_results.jsonl"))
+    parser.add_argument("--checkpoint-dir", type=Path, default=Path(".research_checkpoints"))
+    parser.add_argument("--concurrency", type=int, default=settings.research_batch_concurrency)
+    parser.add_argument("--email", action="store_true", help="Email each report once it is written")
+    args = parser.parse_args()
+
+    runner = BatchRunner(args.output, args.checkpoint_dir, concurrency=args.concurrency, send_email=args.email)
+    asyncio.run(runner.run(load_queries(args.queries)))
@@ -1,28 +1,23 @@
-from typing import Dict
-
+from pydantic import BaseModel, Field
 from agents.agent import Agent
-from agents.tool import function_tool
 
 from src.app.ai_researcher.agent_name_enum import AgentNames
 from src.app.settings import get_settings
 
 settings = get_settings()
 
-@function_tool
-def send_email(subject: str, html_body: str) -> Dict[str, str]:
-    """Send an email with the given subject and HTML body"""
-    print(f"Sending email with subject: {subject}")
-    print(f"Email body (HTML): {html_body}")
-    return {"success": "Email sent successfully!"}
+# The report itself is rendered to HTML locally (see mailer.py); the model only writes the subject line
+INSTRUCTIONS = """You write the subject line of an email that delivers a research report.
+You will be given the report's short summary. Reply with a concise, specific subject line of at most 12 words."""
+
 
+class EmailSubject(BaseModel):
+    subject: str = Field(description="The subject line of the email.")
 
-INSTRUCTIONS = """You are able to send a nicely formatted HTML email based on a detailed report.
-You will be provided with a detailed report. You should use your tool to send one email, providing the 
-report converted into clean, well presented HTML with an appropriate subject line."""
 
 email_agent = Agent(
     name=AgentNames.EMAIL_AGENT.value,
     instructions=INSTRUCTIONS,
-    tools=[send_email],
     model=settings.openai_model,
+    output_type=EmailSubject,
 )
@@ -0,0 +1,98 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Generic, Optional, Sequence, TypeVar
+
+import openai
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# When the current attempt was queued for a worker (time.monotonic()), for fn to record how long it waited.
+# A first attempt is queued when fan_out starts, a retry when its backoff ends.
+attempt_queued_at: ContextVar[Optional[float]] = ContextVar("attempt_queued_at", default=None)
+
+
+@dataclass
+class FanOutConfig:
+    concurrency: int = 5
+    timeout: float = 90.0  # per attempt, in seconds
+    retries: int = 2
+    backoff_base: float = 1.0
+    backoff_max: float = 10.0
+
+
+@dataclass
+class FanOutResult(Generic[T, R]):
+    index: int
+    item: T
+    value: Optional[R] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def is_transient(error: BaseException) -> bool:
+    """ Timeouts, rate limits, connection drops and 5xx responses are worth retrying, anything else is not """
+    return isinstance(
+        error,
+        (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError),
+    )
+
+
+async def fan_out(
+    items: Sequence[T],
+    fn: Callable[[T], Awaitable[R]],
+    config: Optional[FanOutConfig] = None,
+    retry_on: Callable[[BaseException], bool] = is_transient,
+) -> AsyncIterator[FanOutResult[T, R]]:
+    """ Run fn over items on a pool of config.concurrency workers, yielding each result as it completes
+
+    Every attempt is bounded by config.timeout, transient failures are retried with exponential backoff and jitter,
+    and failures are yielded as results with their error rather than raised, so one bad item never sinks the rest.
+    Closing the iterator early cancels the work still in flight.
+    """
+    config = config or FanOutConfig()
+    pending: asyncio.Queue = asyncio.Queue()
+    queued_at = time.monotonic()
+    for index, item in enumerate(items):
+        pending.put_nowait((index, item))
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def run_one(index: int, item: T) -> FanOutResult[T, R]:
+        start = time.perf_counter()
+        attempt = 0
+        queued = queued_at
+        while True:
+            attempt += 1
+            # fn runs in this context (or a copy of it), so it sees the value set here
+            attempt_queued_at.set(queued)
+            try:
+                value = await asyncio.wait_for(fn(item), config.timeout)
+                return FanOutResult(index, item, value=value, attempts=attempt, elapsed=time.perf_counter() - start)
+            except Exception as e:
+                if attempt > config.retries or not retry_on(e):
+                    return FanOutResult(index, item, error=e, attempts=attempt, elapsed=time.perf_counter() - start)
+                delay = min(config.backoff_max, config.backoff_base * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                queued = time.monotonic()
+
+    async def worker():
+        while not pending.empty():
+            index, item = pending.get_nowait()
+            results.put_nowait(await run_one(index, item))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(config.concurrency, len(items)))]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
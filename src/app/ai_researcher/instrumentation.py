@@ -0,0 +1,283 @@
+"""Per-stage spans of research runs: wall time, queue time, tokens and cost of planning, each search, the report
+and the email.
+
+Finished traces are appended to a JSON-lines file in the OTLP/JSON encoding (one ExportTraceServiceRequest a line),
+which an OpenTelemetry collector's otlpjsonfile receiver can ingest. Summarise the stage latencies across every run
+recorded in such a file with:
+
+    cd src/app/ai_researcher
+    python instrumentation.py research_spans.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+SCOPE_NAME = "ai_researcher"
+SERVICE_NAME = "ai-researcher"
+
+# Attribute keys, following the OpenTelemetry GenAI semantic conventions where there is one
+INPUT_TOKENS = "gen_ai.usage.input_tokens"
+OUTPUT_TOKENS = "gen_ai.usage.output_tokens"
+COST = "research.cost_usd"
+QUEUE_TIME = "research.queue_time_s"
+
+current_span: ContextVar[Optional["Span"]] = ContextVar("research_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def add(self, key: str, value: float) -> None:
+        """ Accumulate a numeric attribute, e.g. the tokens of several agent calls within one stage """
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in self.attributes.items()],
+            # STATUS_CODE_OK is 1, STATUS_CODE_ERROR is 2; a cancelled stage is left unset
+            "status": {"code": {"ok": 1, "error": 2}.get(self.status, 0), "message": self.error or ""},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def from_otlp_value(value: dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+class FileSpanExporter:
+    """ Appends finished traces to a JSON-lines file, one OTLP ExportTraceServiceRequest per trace """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": otlp_value(SERVICE_NAME)}]},
+                    "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+                }
+            ]
+        }
+        with self.lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(request) + "\n")
+
+
+def percentiles(durations: list[float]) -> dict[str, float]:
+    durations = sorted(durations)
+    quantiles = statistics.quantiles(durations, n=100, method="inclusive") if len(durations) > 1 else durations * 99
+    return {
+        "count": len(durations),
+        "p50": quantiles[49],
+        "p95": quantiles[94],
+        "max": durations[-1],
+    }
+
+
+def format_summary(summary: dict[str, dict[str, float]]) -> str:
+    lines = [f"{'stage':<16}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'max s':>9}"]
+    for name, stats in sorted(summary.items()):
+        lines.append(f"{name:<16}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['max']:>9.2f}")
+    return "\n".join(lines)
+
+
+class Tracer:
+    """ Records nested stage spans, keeps recent durations per stage for p50/p95, and exports each finished trace
+
+    The current span lives in a context variable, so searches running in their own tasks nest under the run's span.
+    """
+
+    def __init__(self, exporter: Optional[FileSpanExporter] = None, max_samples: int = 1000):
+        self.exporter = exporter
+        self.durations: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=max_samples))
+        # Spans of traces whose root span is still open, exported together once it closes
+        self.pending: dict[str, list[Span]] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        if parent is None and self.exporter is not None:
+            # The trace's spans are buffered until its root ends, and only when there is somewhere to export them
+            with self.lock:
+                self.pending[span.trace_id] = []
+        # Set and restored explicitly rather than with a token: stages that are async generators may be closed
+        # from another context, where resetting a token would raise
+        current_span.set(span)
+        try:
+            yield span
+        except (GeneratorExit, KeyboardInterrupt, SystemExit):
+            span.status = "cancelled"
+            raise
+        except asyncio.CancelledError:
+            # A stage cut short, e.g. searches still in flight at an adaptive early stop
+            span.status = "cancelled"
+            raise
+        except Exception as e:
+            span.status = "error"
+            span.error = repr(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            current_span.set(parent)
+            self.record(span)
+
+    def record(self, span: Span) -> None:
+        with self.lock:
+            if span.status == "ok":
+                self.durations[span.name].append(span.duration)
+            if self.exporter is None:
+                return
+            if span.parent_id is None:
+                spans = self.pending.pop(span.trace_id, []) + [span]
+            elif span.trace_id in self.pending:
+                self.pending[span.trace_id].append(span)
+                return
+            else:
+                # Finished after its trace was exported
+                spans = [span]
+        try:
+            self.exporter.export(spans)
+        except OSError as e:
+            print(f"Failed to export research spans: {e}")
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """ p50/p95/max wall time of every stage over the recent runs of this process """
+        with self.lock:
+            return {name: percentiles(list(durations)) for name, durations in self.durations.items() if durations}
+
+
+def record_span_usage(usage: Any, cost: float) -> None:
+    """ Add an agent call's token usage and cost to the current span, if there is one """
+    if (span := current_span.get()) is not None:
+        span.add(INPUT_TOKENS, usage.input_tokens)
+        span.add(OUTPUT_TOKENS, usage.output_tokens)
+        span.add(COST, cost)
+
+
+def record_span_queue_time(seconds: float) -> None:
+    """ Add time the current stage spent waiting (for a worker slot or the rate limits) rather than working """
+    if (span := current_span.get()) is not None:
+        span.add(QUEUE_TIME, seconds)
+
+
+@lru_cache()
+def get_tracer() -> Tracer:
+    """ Get the process-wide tracer shared by every research run """
+    exporter = FileSpanExporter(settings.research_spans_path) if settings.research_spans_path else None
+    return Tracer(exporter)
+
+
+def load_spans(path: Path) -> list[Span]:
+    spans = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for span in scope_spans["spans"]:
+                        spans.append(
+                            Span(
+                                name=span["name"],
+                                trace_id=span["traceId"],
+                                span_id=span["spanId"],
+                                parent_id=span.get("parentSpanId"),
+                                start_ns=int(span["startTimeUnixNano"]),
+                                end_ns=int(span["endTimeUnixNano"]),
+                                attributes={a["key"]: from_otlp_value(a["value"]) for a in span["attributes"]},
+                                status={1: "ok", 2: "error"}.get(span["status"]["code"], "cancelled"),
+                            )
+                        )
+    return spans
+
+
+def summarize(spans: list[Span]) -> dict[str, dict[str, float]]:
+    """ p50/p95/max wall time, mean queue time, mean tokens and total cost of every stage """
+    by_name: dict[str, list[Span]] = defaultdict(list)
+    for span in spans:
+        if span.status == "ok":
+            by_name[span.name].append(span)
+    summary = {}
+    for name, stage_spans in by_name.items():
+        summary[name] = {
+            **percentiles([span.duration for span in stage_spans]),
+            "queue_mean": statistics.fmean(span.attributes.get(QUEUE_TIME, 0.0) for span in stage_spans),
+            "tokens_mean": statistics.fmean(
+                span.attributes.get(INPUT_TOKENS, 0) + span.attributes.get(OUTPUT_TOKENS, 0) for span in stage_spans
+            ),
+            "cost": sum(span.attributes.get(COST, 0.0) for span in stage_spans),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise the stage latencies of recorded research runs")
+    parser.add_argument("spans", type=Path, nargs="?", default=Path(settings.research_spans_path or "research_spans.jsonl"))
+    args = parser.parse_args()
+
+    summary = summarize(load_spans(args.spans))
+    print(format_summary(summary))
+    print()
+    print(f"{'stage':<16}{'queue s':>9}{'tokens':>9}{'cost $':>10}")
+    for name, stats in sorted(summary.items()):
+        print(f"{name:<16}{stats['queue_mean']:>9.2f}{stats['tokens_mean']:>9.0f}{stats['cost']:>10.4f}")
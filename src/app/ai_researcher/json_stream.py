@@ -0,0 +1,76 @@
+import json
+
+
+class JsonFieldStream:
+    """ Decodes one top-level string field of a JSON object while the object is still being streamed
+
+    Structured agent outputs arrive as raw JSON text deltas; feed() takes each delta and returns the newly
+    decoded characters of the field, with escapes (including split \\uXXXX surrogate pairs) resolved.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.depth = 0
+        self.in_string = False
+        self.after_colon = False
+        self.capturing = False
+        self.escape: str | None = None
+        self.high_surrogate = ""
+        self.key: list[str] = []
+        self.last_key: str | None = None
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        out: list[str] = []
+        for char in delta:
+            if self.in_string:
+                self.feed_string(char, out)
+            elif char == '"':
+                self.in_string = True
+                self.key = []
+                self.capturing = (
+                    not self.done and self.depth == 1 and self.after_colon and self.last_key == self.field
+                )
+            elif char in "{[":
+                self.depth += 1
+                if self.depth == 1:
+                    self.after_colon = False
+            elif char in "}]":
+                self.depth -= 1
+            elif self.depth == 1 and char == ":":
+                self.after_colon = True
+            elif self.depth == 1 and char == ",":
+                self.after_colon = False
+        return "".join(out)
+
+    def feed_string(self, char: str, out: list[str]) -> None:
+        if self.escape is not None:
+            self.escape += char
+            if self.escape[1] == "u" and len(self.escape) < 6:
+                return
+            decoded, self.escape = json.loads(f'"{self.escape}"'), None
+            if "\ud800" <= decoded <= "\udbff":
+                # First half of a surrogate pair, wait for the second
+                self.high_surrogate = decoded
+                return
+            if self.high_surrogate:
+                decoded = (self.high_surrogate + decoded).encode("utf-16", "surrogatepass").decode("utf-16")
+                self.high_surrogate = ""
+            self.emit(decoded, out)
+        elif char == "\\":
+            self.escape = char
+        elif char == '"':
+            self.in_string = False
+            if self.capturing:
+                self.capturing = False
+                self.done = True
+            elif self.depth == 1 and not self.after_colon:
+                self.last_key = "".join(self.key)
+        else:
+            self.emit(char, out)
+
+    def emit(self, text: str, out: list[str]) -> None:
+        if self.capturing:
+            out.append(text)
+        elif self.depth == 1 and not self.after_colon:
+            self.key.append(text)
@@ -0,0 +1,315 @@
+import atexit
+import hashlib
+import queue
+import smtplib
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from email.utils import make_msgid
+from functools import lru_cache
+from typing import Optional
+
+from markdown_it import MarkdownIt
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+# Raw HTML in a report is escaped rather than passed through to the email
+markdown = MarkdownIt("commonmark", {"html": False}).enable("table")
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+body {{ font-family: -apple-system, Helvetica, Arial, sans-serif; line-height: 1.5; color: #222; max-width: 760px; }}
+h1, h2, h3 {{ color: #0b5394; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; }}
+code, pre {{ background: #f4f4f4; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def render_report_html(markdown_report: str) -> str:
+    """ Render a markdown report as a standalone HTML email body, without calling a model """
+    return HTML_TEMPLATE.format(body=markdown.render(markdown_report))
+
+
+def content_hash(to: str, body: str) -> str:
+    # Not the subject: it is written fresh for every email, so the same report would rarely match
+    return hashlib.sha256("\0".join((to.strip().lower(), body)).encode()).hexdigest()
+
+
+@dataclass
+class OutgoingEmail:
+    to: str
+    subject: str
+    html: str
+    text: str
+    digest: str
+    queued_at: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future)
+
+
+class SmtpConnection:
+    """ One SMTP connection kept open across batches, reopened when the server drops it or it sits idle too long """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        starttls: bool = True,
+        timeout: float = 30.0,
+        idle_timeout: float = 60.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+        self.sessions = 0
+
+    def alive(self) -> bool:
+        if self.smtp is None or time.monotonic() - self.last_used > self.idle_timeout:
+            return False
+        try:
+            return self.smtp.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    def get(self) -> smtplib.SMTP:
+        if not self.alive():
+            self.close()
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            self.smtp = smtp
+            self.sessions += 1
+        self.last_used = time.monotonic()
+        return self.smtp
+
+    def close(self) -> None:
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+
+
+class MailQueue:
+    """ Background email delivery: submit() only enqueues, a daemon thread sends whatever arrived within batch_window
+    seconds of each other over one pooled SMTP session
+
+    A message with the same recipient and body as one already queued or sent is not sent again.
+    With no connection the queue runs dry: messages are printed instead of sent.
+    """
+
+    def __init__(
+        self,
+        sender: str,
+        connection: Optional[SmtpConnection] = None,
+        batch_window: float = 2.0,
+        max_batch: int = 50,
+        max_remembered: int = 10_000,
+        max_latencies: int = 1000,
+    ):
+        self.sender = sender
+        self.connection = connection
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_remembered = max_remembered
+        self.queue: queue.Queue[Optional[OutgoingEmail]] = queue.Queue()
+        self.seen: OrderedDict[str, None] = OrderedDict()
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.sent = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.batches = 0
+        # Delivery latencies of the most recent emails only
+        self.latencies: deque[float] = deque(maxlen=max_latencies)
+        self.thread = threading.Thread(target=self.run, name="mail-queue", daemon=True)
+        self.thread.start()
+
+    def is_duplicate(self, to: str, html: str) -> bool:
+        """ Whether submit would skip this email, to check before paying for anything else that goes into it """
+        with self.lock:
+            return content_hash(to, html) in self.seen
+
+    def submit(self, to: str, subject: str, html: str, text: str = "") -> Future:
+        """ Queue an email, returning a future that resolves to "sent", "duplicate" or "dry-run" """
+        email = OutgoingEmail(to, subject, html, text, content_hash(to, html))
+        with self.lock:
+            if email.digest in self.seen:
+                self.deduplicated += 1
+                email.future.set_result("duplicate")
+                return email.future
+            self.seen[email.digest] = None
+            if len(self.seen) > self.max_remembered:
+                self.seen.popitem(last=False)
+            self.queued += 1
+        self.queue.put(email)
+        return email.future
+
+    def collect(self) -> tuple[list[OutgoingEmail], bool]:
+        """ Block for the first email, then gather whatever else arrives within the batch window """
+        first = self.queue.get()
+        if first is None:
+            return [], True
+        emails = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(emails) < self.max_batch and (remaining := deadline - time.monotonic()) > 0:
+            try:
+                email = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if email is None:
+                return emails, True
+            emails.append(email)
+        return emails, False
+
+    def message(self, email: OutgoingEmail) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = email.to
+        message["Subject"] = email.subject
+        message["Message-ID"] = make_msgid()
+        message.set_content(email.text or "This report is best viewed in an HTML capable email client.")
+        message.add_alternative(email.html, subtype="html")
+        return message
+
+    def deliver(self, email: OutgoingEmail) -> str:
+        if self.connection is None:
+            print(f"Dry run, not sending email to {email.to or '(no recipient)'}: {email.subject}")
+            return "dry-run"
+        message = self.message(email)
+        try:
+            self.connection.get().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The pooled connection went away between the liveness check and the send; retry once on a fresh one
+            self.connection.close()
+            self.connection.get().send_message(message)
+        return "sent"
+
+    def run(self) -> None:
+        stopping = False
+        while not stopping:
+            emails, stopping = self.collect()
+            if emails:
+                self.batches += 1
+            for email in emails:
+                try:
+                    outcome = self.deliver(email)
+                except Exception as e:
+                    self.failed += 1
+                    with self.lock:
+                        # Let a later submit of the same email try again
+                        self.seen.pop(email.digest, None)
+                    print(f"Failed to send email to {email.to}: {e}")
+                    email.future.set_exception(e)
+                    continue
+                self.sent += 1
+                self.latencies.append(time.monotonic() - email.queued_at)
+                email.future.set_result(outcome)
+
+    def metrics(self) -> dict[str, float]:
+        latencies = sorted(self.latencies)
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "batches": self.batches,
+            "smtp_sessions": self.connection.sessions if self.connection else 0,
+            "pending": self.queue.qsize(),
+            "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    def close(self, timeout: float = 30.0) -> None:
+        """ Send what is queued (bounded by timeout), stop the sender thread and close the SMTP connection """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+        if self.connection is not None:
+            self.connection.close()
+
+
+@lru_cache()
+def get_mail_queue() -> MailQueue:
+    """ Get the process-wide mail queue shared by every research run """
+    connection = None
+    if settings.smtp_host:
+        connection = SmtpConnection(
+            settings.smtp_host,
+            settings.smtp_port,
+            username=settings.smtp_username,
+            password=settings.smtp_password,
+            starttls=settings.smtp_starttls,
+            idle_timeout=settings.smtp_idle_timeout,
+        )
+    mail_queue = MailQueue(
+        settings.email_from,
+        connection,
+        batch_window=settings.email_batch_window,
+        max_batch=settings.email_max_batch,
+    )
+    # Deliver what is still queued when the process exits normally
+    atexit.register(mail_queue.close)
+    return mail_queue
+
+
+class LocalSmtpServer:
+    """ A local stand-in SMTP server, for exercising the mail queue without sending real email
+
+    Records every message it receives. Needs aiosmtpd (in the dev dependency group). Point a SmtpConnection, or
+    SMTP_HOST and SMTP_PORT with SMTP_STARTTLS=false, at its host and port.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025):
+        from aiosmtpd.controller import Controller
+
+        self.messages: list[bytes] = []
+        self.sessions = 0
+        server = self
+
+        class Handler:
+            async def handle_EHLO(self, smtp_server, session, envelope, hostname, responses):
+                server.sessions += 1
+                session.host_name = hostname
+                return responses
+
+            async def handle_DATA(self, smtp_server, session, envelope):
+                server.messages.append(envelope.content)
+                return "250 Message accepted for delivery"
+
+        self.controller = Controller(Handler(), hostname=host, port=port)
+        self.host = host
+        self.port = port
+
+    def __enter__(self) -> "LocalSmtpServer":
+        self.controller.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.controller.stop()
@@ -5,11 +5,17 @@ from src.app.settings import get_settings
 
 settings = get_settings()
 
-HOW_MANY_SEARCHES = 5
+HOW_MANY_SEARCHES = settings.research_how_many_searches
+MAX_SEARCHES = settings.research_max_searches
 
 INSTRUCTIONS = f"You are a helpful research assistant. Given a query, come up with a set of web searches \
 to perform to best answer the query. Output {HOW_MANY_SEARCHES} terms to query for."
 
+RANKED_INSTRUCTIONS = f"You are a helpful research assistant. Given a query, come up with a ranked list of web \
+searches to perform to best answer the query, the most important first. Output as many terms as the query needs, \
+from a few for a simple factual question up to {MAX_SEARCHES} for a broad or difficult topic. \
+Later searches may be skipped once the earlier ones cover the query, so order them by how much they add."
+
 
 class WebSearchItem(BaseModel):
     reason: str = Field(description="Your reasoning for why this search is important to the query.")
@@ -24,4 +30,10 @@ planner_agent = Agent(
     instructions=INSTRUCTIONS,
     model=settings.openai_model,
     output_type=WebSearchPlan,
-)
\ No newline at end of file
+)
+
+# Used by the adaptive research mode, which runs the searches in plan order and stops once they stop adding anything
+ranked_planner_agent = planner_agent.clone(
+    name=AgentNames.RANKED_PLANNER_AGENT.value,
+    instructions=RANKED_INSTRUCTIONS,
+)
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """ Request and token per-minute limits shared by every agent call, as two token buckets
+
+    Callers reserve an estimate of a call's tokens up front and settle the difference once the real usage is known,
+    so a run of underestimates is paid back by making later callers wait.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = float(requests_per_minute or 0)
+        self.tokens = float(tokens_per_minute or 0)
+        self.updated = time.monotonic()
+        # Waiters queue on the lock, so they are served in arrival order
+        self.lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        if self.requests_per_minute:
+            self.requests = min(self.requests_per_minute, self.requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self.tokens = min(self.tokens_per_minute, self.tokens + elapsed * self.tokens_per_minute / 60)
+
+    def wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests_per_minute and self.requests < 1:
+            wait = max(wait, (1 - self.requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            # A call bigger than the whole bucket only waits for a full one
+            needed = min(tokens, self.tokens_per_minute)
+            if self.tokens < needed:
+                wait = max(wait, (needed - self.tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+    async def acquire(self, tokens: int) -> None:
+        """ Wait until one request and the estimated tokens fit in the limits, then reserve them """
+        async with self.lock:
+            while True:
+                self.refill()
+                wait = self.wait_time(tokens)
+                if wait <= 0:
+                    break
+                self.waited += wait
+                await asyncio.sleep(wait)
+            if self.requests_per_minute:
+                self.requests -= 1
+            if self.tokens_per_minute:
+                self.tokens -= tokens
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """ Correct a reservation once the call's real token usage is known """
+        if self.tokens_per_minute:
+            self.refill()
+            self.tokens -= actual - estimated
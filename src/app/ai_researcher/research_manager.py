@@ -1,92 +1,424 @@
 import asyncio
-from agents.run import Runner
+import time
+from contextlib import aclosing
+from typing import AsyncIterator
+
+import numpy as np
+from agents.run import RunConfig, Runner
 from agents.tracing import trace, gen_trace_id
+from openai.types.responses import ResponseTextDeltaEvent
 
+from adaptive import Budget, NoveltyTracker
+from fanout import FanOutConfig, attempt_queued_at, fan_out
+from instrumentation import COST, Tracer, format_summary, get_tracer, record_span_queue_time, record_span_usage
+from rate_limit import RateLimiter
+from json_stream import JsonFieldStream
+from semantic_cache import embed, get_plan_cache, get_summary_cache
 from search_agent import search_agent
-from planner_agent import planner_agent, WebSearchItem, WebSearchPlan
-from writer_agent import writer_agent, ReportData
-from email_agent import email_agent
+from planner_agent import MAX_SEARCHES, planner_agent, ranked_planner_agent, WebSearchItem, WebSearchPlan
+from writer_agent import writer_agent, reviser_agent, ReportAddendum, ReportData
+from email_agent import email_agent, EmailSubject
+from mailer import MailQueue, get_mail_queue, render_report_html
+from src.app.settings import get_settings
+
+settings = get_settings()
+
 
 class ResearchManager:
+    def __init__(
+        self,
+        search_config: FanOutConfig | None = None,
+        pipelined: bool = settings.research_pipelined,
+        draft_after: int = settings.research_draft_after,
+        use_cache: bool = settings.research_cache_enabled,
+        adaptive: bool = settings.research_adaptive,
+        budget: Budget | None = None,
+        rate_limiter: RateLimiter | None = None,
+        tracer: Tracer | None = None,
+        mail_queue: MailQueue | None = None,
+        run_config: RunConfig | None = None,
+    ):
+        self.pipelined = pipelined
+        self.tracer = tracer or get_tracer()
+        self.mail_queue = mail_queue
+        # Applies to every agent run, e.g. to swap in another model provider
+        self.run_config = run_config
+        # Shared between managers to keep many concurrent runs (e.g. a batch) under the account's limits
+        self.rate_limiter = rate_limiter
+        self.use_cache = use_cache
+        self.adaptive = adaptive
+        self.budget = budget or Budget(
+            max_tokens=settings.research_budget_tokens or None,
+            max_dollars=settings.research_budget_dollars or None,
+            input_cost_per_million=settings.openai_input_cost_per_million,
+            output_cost_per_million=settings.openai_output_cost_per_million,
+            search_call_cost=settings.web_search_call_cost,
+        )
+        self.draft_after = draft_after
+        self.search_config = search_config or FanOutConfig(
+            concurrency=settings.research_search_concurrency,
+            timeout=settings.research_search_timeout,
+            retries=settings.research_search_retries,
+            backoff_base=settings.research_search_backoff,
+        )
+
     async def run(self, query: str):
         """ Run the deep research process, yielding the status updates and the final report"""
         trace_id = gen_trace_id()
-        with trace("Research trace", trace_id=trace_id):
+        mode = "pipelined" if self.pipelined else "staged"
+        with trace("Research trace", trace_id=trace_id), self.tracer.span(
+            "research", **{"research.query": query, "research.mode": mode, "research.adaptive": self.adaptive}
+        ):
             print(f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
             yield f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}"
             print("Starting research...")
             
             search_plan = await self.plan_searches(query)
             yield "Searches planned, starting to search..." 
-            
-            search_results = await self.perform_searches(search_plan)
+
+            if self.pipelined:
+                async for update in self.run_pipelined(query, search_plan):
+                    yield update
+                self.print_summary()
+                return
+
+            search_results = []
+            async for summary in self.stream_searches(search_plan):
+                search_results.append(summary)
+                yield f"Searching... {len(search_results)} summaries so far"
             yield "Searches complete, writing report..."
             
-            report = await self.write_report(query, search_results)
-            yield "Report written, sending email..."
+            async for update in self.write_report_streamed(query, search_results):
+                if isinstance(update, ReportData):
+                    report = update
+                else:
+                    yield update
+            # The report stays on screen while the email goes out, with the status below it
+            yield f"{report.markdown_report}\n\n*Sending email...*"
             
-            await self.send_email(report)
-            yield "Email sent, research complete"
+            try:
+                await self.send_email(report)
+            except Exception as e:
+                # The report is written either way, so it is still shown
+                print(f"Failed to send email: {e}")
+            self.print_summary()
             
             yield report.markdown_report
+
+    async def run_pipelined(self, query: str, search_plan: WebSearchPlan) -> AsyncIterator[str]:
+        """ Overlap the stages: draft from the first results while the other searches run, then append a section with
+        the results that came in later, and email the report while it is already on screen """
+        search_results = []
+        draft_task = None
+        num_drafted = 0
+        # The draft streams in the background, keeping only its latest text for when there is room to show it
+        draft_progress = {"markdown": ""}
+        draft_changed = asyncio.Event()
+
+        async def draft(results: list[str]) -> ReportData:
+            async for update in self.write_report_streamed(query, results):
+                if isinstance(update, ReportData):
+                    return update
+                draft_progress["markdown"] = update
+                draft_changed.set()
+
+        try:
+            async for summary in self.stream_searches(search_plan):
+                search_results.append(summary)
+                yield f"Searching... {len(search_results)} summaries so far"
+                if draft_task is None and len(search_results) >= self.draft_after:
+                    num_drafted = len(search_results)
+                    draft_task = asyncio.create_task(draft(list(search_results)))
+                    yield "Drafting the report while the remaining searches finish..."
+
+            if draft_task is None:
+                yield "Searches complete, writing report..."
+                async for update in self.write_report_streamed(query, search_results):
+                    if isinstance(update, ReportData):
+                        report = update
+                    else:
+                        yield update
+            else:
+                yield "Searches complete, finishing the draft..."
+                while not draft_task.done():
+                    changed = asyncio.ensure_future(draft_changed.wait())
+                    await asyncio.wait({draft_task, changed}, return_when=asyncio.FIRST_COMPLETED)
+                    changed.cancel()
+                    draft_changed.clear()
+                    if draft_progress["markdown"]:
+                        yield draft_progress["markdown"]
+                report = draft_task.result()
+                if len(search_results) > num_drafted:
+                    # Shown below the draft, which stays on screen while the new section streams in after it
+                    yield f"{report.markdown_report}\n\n*Adding the remaining results...*"
+                    async for update in self.revise_report_streamed(query, report, search_results[num_drafted:]):
+                        if isinstance(update, ReportData):
+                            report = update
+                        else:
+                            yield update
+        finally:
+            if draft_task and not draft_task.done():
+                draft_task.cancel()
+
+        email_task = asyncio.create_task(self.send_email(report))
+        # The report stays the last thing shown, the email finishes in the background of the UI update
+        yield report.markdown_report
+        try:
+            await email_task
+        except Exception as e:
+            print(f"Failed to send email: {e}")
         
 
-    async def plan_searches(self, query: str) -> WebSearchPlan:
-        """ Plan the searches to perform for the query """
-        print("Planning searches...")
+    async def embed_for_cache(self, texts: list[str]) -> np.ndarray | None:
+        """ Embeddings for the semantic caches, or None when caching is off or the embedding call fails """
+        if not self.use_cache or not texts:
+            return None
+        try:
+            return await embed(texts)
+        except Exception as e:
+            print(f"Skipping the cache, failed to embed: {e}")
+            return None
+
+    def print_summary(self) -> None:
+        print(f"Research spend: {self.budget.summary()}")
+        print(f"Stage latencies across runs:\n{format_summary(self.tracer.summary())}")
+
+    def estimate_tokens(self, agent, input: str) -> int:
+        # Roughly 4 characters a token, plus room for the answer; settled against the real usage afterwards
+        return (len(str(agent.instructions)) + len(input)) // 4 + settings.research_expected_output_tokens
+
+    async def limit_rate(self, agent, input: str) -> int:
+        """ Wait for room under the shared rate limits, returning the tokens reserved """
+        if self.rate_limiter is None:
+            return 0
+        estimate = self.estimate_tokens(agent, input)
+        start = time.monotonic()
+        await self.rate_limiter.acquire(estimate)
+        record_span_queue_time(time.monotonic() - start)
+        return estimate
+
+    def record_usage(self, usage, reserved: int) -> None:
+        self.budget.add(usage)
+        record_span_usage(usage, self.budget.price(usage.input_tokens, usage.output_tokens))
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(reserved, usage.input_tokens + usage.output_tokens)
+
+    async def _run_agent(self, agent, input: str):
+        """ Runner.run under the shared rate limits, adding the run's token usage to the budget """
+        reserved = await self.limit_rate(agent, input)
         result = await Runner.run(
-            planner_agent,
-            f"Query: {query}",
+            agent,
+            input,
+            run_config=self.run_config,
         )
-        print(f"Will perform {len(result.final_output.searches)} searches")
-        return result.final_output_as(WebSearchPlan)
+        self.record_usage(result.context_wrapper.usage, reserved)
+        return result
+
+    async def plan_searches(self, query: str) -> WebSearchPlan:
+        """ Plan the searches to perform for the query, reusing the plan of a near-identical recent query
+
+        The adaptive mode asks for a ranked plan of up to MAX_SEARCHES searches instead of a fixed number.
+        """
+        kind, agent = ("ranked", ranked_planner_agent) if self.adaptive else ("fixed", planner_agent)
+        with self.tracer.span("plan") as span:
+            vectors = await self.embed_for_cache([query])
+            if vectors is not None and (search_plan := get_plan_cache(kind).get(vectors[0], query)) is not None:
+                span.attributes["research.cache_hit"] = True
+                span.attributes["research.searches"] = len(search_plan.searches)
+                return search_plan
+
+            print("Planning searches...")
+            result = await self._run_agent(agent, f"Query: {query}")
+            search_plan = result.final_output_as(WebSearchPlan)
+            if self.adaptive:
+                search_plan.searches = search_plan.searches[:MAX_SEARCHES]
+            span.attributes["research.cache_hit"] = False
+            span.attributes["research.searches"] = len(search_plan.searches)
+            print(f"Will perform {'up to ' if self.adaptive else ''}{len(search_plan.searches)} searches")
+            # Only written on a miss: a plan read from the cache is left as it is
+            if vectors is not None:
+                get_plan_cache(kind).put(query, vectors[0], search_plan)
+            return search_plan
     
-    async def search(self, item: WebSearchItem) -> str | None:
-        """ Perform a search for the query """
-        input = f"Search term: {item.query}\nReason for searching: {item.reason}"
-        try:
-            result = await Runner.run(
-                search_agent,
-                input,
-            )
+    async def search(self, item: WebSearchItem) -> str:
+        """ Perform a search for the query, errors are left to the fan-out to retry or report """
+        with self.tracer.span("search", **{"research.search_term": item.query}) as span:
+            # How long this attempt waited for a worker of the fan-out
+            if (queued := attempt_queued_at.get()) is not None:
+                record_span_queue_time(time.monotonic() - queued)
+            input = f"Search term: {item.query}\nReason for searching: {item.reason}"
+            self.budget.search_calls += 1
+            span.add(COST, self.budget.price(0, 0, search_calls=1))
+            result = await self._run_agent(search_agent, input)
             return str(result.final_output)
-        except Exception:
-            return None
 
-    async def perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
-        """ Perform the searches to perform for the query """
+    async def enough_searched(self, novelty: NoveltyTracker, summary: str) -> bool:
+        """ Adaptive mode: whether to stop issuing searches, because the budget is spent or new summaries
+        no longer add information. Other modes always run the full plan """
+        if not self.adaptive:
+            return False
+        if self.budget.exhausted:
+            print(f"Stopping searches, budget exhausted: {self.budget.summary()}")
+            return True
+        try:
+            vectors = await embed([summary])
+        except Exception as e:
+            print(f"Skipping the novelty check, failed to embed: {e}")
+            return False
+        gain = novelty.add(vectors[0])
+        print(f"Search summary novelty {gain:.3f}")
+        if novelty.saturated:
+            print(f"Stopping searches, the last {novelty.patience} summaries added little new information")
+            return True
+        return False
+
+    async def stream_searches(self, search_plan: WebSearchPlan) -> AsyncIterator[str]:
+        """ Perform the planned searches on a bounded worker pool, yielding each summary as soon as it is ready
+
+        Summaries of near-identical recent search terms come straight from the cache, before any search runs.
+        """
         print("Searching...")
         num_completed = 0
-        tasks = [asyncio.create_task(self.search(item)) for item in search_plan.searches]
-        
-        results = []
-        for task in asyncio.as_completed(tasks):
-            result = await task
-            if result is not None:
-                results.append(result)
+        num_failed = 0
+        novelty = NoveltyTracker(
+            threshold=settings.research_novelty_threshold,
+            patience=settings.research_novelty_patience,
+            min_items=settings.research_min_searches,
+        )
+        # One embedding request for the whole plan
+        vectors = await self.embed_for_cache([item.query for item in search_plan.searches])
+        to_search = []
+        for index, item in enumerate(search_plan.searches):
+            summary = get_summary_cache().get(vectors[index], item.query) if vectors is not None else None
+            if summary is None:
+                to_search.append(index)
+                continue
             num_completed += 1
-            print(f"Searching... {num_completed}/{len(tasks)} completed")
-        
-        print("Finished searching")
-        return results
+            yield summary
+            if await self.enough_searched(novelty, summary):
+                return
+
+        # Workers take the searches in plan order, so in adaptive mode the highest ranked ones run first
+        items = [search_plan.searches[index] for index in to_search]
+        async with aclosing(fan_out(items, self.search, self.search_config)) as results:
+            async for result in results:
+                num_completed += 1
+                if result.ok:
+                    # Only searches that missed the cache run here, so only misses are written back
+                    if vectors is not None:
+                        get_summary_cache().put(result.item.query, vectors[to_search[result.index]], result.value)
+                    yield result.value
+                else:
+                    num_failed += 1
+                    print(f"Search for {result.item.query!r} failed after {result.attempts} attempts: {result.error!r}")
+                print(f"Searching... {num_completed}/{len(search_plan.searches)} completed")
+                if result.ok and await self.enough_searched(novelty, result.value):
+                    # Closing the fan-out cancels the searches still in flight
+                    break
+
+        print(f"Finished searching, {num_failed} searches failed")
+
+    async def perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
+        """ Perform the searches to perform for the query """
+        return [summary async for summary in self.stream_searches(search_plan)]
+
+    def report_input(self, query: str, search_results: list[str]) -> str:
+        return f"Original query: {query}\nSummarized search results: {search_results}"
+
+    def revision_input(self, query: str, draft: ReportData, search_results: list[str]) -> str:
+        return (
+            f"Original query: {query}\nDraft report:\n{draft.markdown_report}\n"
+            f"Additional summarized search results: {search_results}"
+        )
+
+    async def stream_report(
+        self, agent, input: str, stage: str, field: str = "markdown_report", output_type: type = ReportData
+    ) -> AsyncIterator[str | ReportData | ReportAddendum]:
+        """ Run a report writing agent streamed, yielding its markdown field as it grows and finally the whole output
+
+        The agent's structured output arrives as JSON text, so the markdown string is decoded as it streams.
+        """
+        with self.tracer.span(stage, **{"research.streamed": True}) as span:
+            reserved = await self.limit_rate(agent, input)
+            result = Runner.run_streamed(agent, input, run_config=self.run_config)
+            markdown_report = JsonFieldStream(field)
+            markdown = ""
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    if delta := markdown_report.feed(event.data.delta):
+                        if not markdown:
+                            span.attributes["research.time_to_first_token_s"] = (time.time_ns() - span.start_ns) / 1e9
+                        markdown += delta
+                        yield markdown
+            self.record_usage(result.context_wrapper.usage, reserved)
+        yield result.final_output_as(output_type)
+
+    async def write_report_streamed(self, query: str, search_results: list[str]) -> AsyncIterator[str | ReportData]:
+        """ Write the report for the query, yielding the markdown as it is generated and then the ReportData """
+        print("Thinking about report...")
+        async for update in self.stream_report(writer_agent, self.report_input(query, search_results), "write_report"):
+            yield update
+        print("Finished writing report")
+
+    def append_addendum(self, draft: ReportData, addendum: ReportAddendum) -> ReportData:
+        return ReportData(
+            short_summary=addendum.short_summary,
+            markdown_report=f"{draft.markdown_report}\n\n{addendum.markdown_section}",
+            follow_up_questions=addendum.follow_up_questions,
+        )
+
+    async def revise_report_streamed(
+        self, query: str, draft: ReportData, search_results: list[str]
+    ) -> AsyncIterator[str | ReportData]:
+        """ Streamed revise_report, yielding the draft followed by the new section as it grows """
+        print("Revising report...")
+        async for update in self.stream_report(
+            reviser_agent,
+            self.revision_input(query, draft, search_results),
+            "revise_report",
+            field="markdown_section",
+            output_type=ReportAddendum,
+        ):
+            if isinstance(update, ReportAddendum):
+                yield self.append_addendum(draft, update)
+            else:
+                yield f"{draft.markdown_report}\n\n{update}"
+        print("Finished revising report")
 
     async def write_report(self, query: str, search_results: list[str]) -> ReportData:
         """ Write the report for the query """
         print("Thinking about report...")
-        input = f"Original query: {query}\nSummarized search results: {search_results}"
-        result = await Runner.run(
-            writer_agent,
-            input,
-        )
+        input = self.report_input(query, search_results)
+        with self.tracer.span("write_report"):
+            result = await self._run_agent(writer_agent, input)
 
         print("Finished writing report")
         return result.final_output_as(ReportData)
     
+    async def revise_report(self, query: str, draft: ReportData, search_results: list[str]) -> ReportData:
+        """ Append a section with the search results that arrived after the draft was started """
+        print("Revising report...")
+        input = self.revision_input(query, draft, search_results)
+        with self.tracer.span("revise_report"):
+            result = await self._run_agent(reviser_agent, input)
+
+        print("Finished revising report")
+        return self.append_addendum(draft, result.final_output_as(ReportAddendum))
+
     async def send_email(self, report: ReportData) -> None:
         print("Writing email...")
-        await Runner.run(
-            email_agent,
-            report.markdown_report,
-        )
-        print("Email sent")
+        with self.tracer.span("email") as span:
+            mail_queue = self.mail_queue or get_mail_queue()
+            html = render_report_html(report.markdown_report)
+            # Queued reports with the same content are only sent once, so a duplicate doesn't need a subject either
+            if mail_queue.is_duplicate(settings.email_to, html):
+                outcome = "duplicate"
+            else:
+                result = await self._run_agent(email_agent, f"Report summary: {report.short_summary}")
+                subject = result.final_output_as(EmailSubject).subject
+                outcome = await asyncio.wrap_future(
+                    mail_queue.submit(settings.email_to, subject, html, text=report.markdown_report)
+                )
+            span.attributes["research.email_outcome"] = outcome
+        print(f"Email {outcome}")
         return report
\ No newline at end of file
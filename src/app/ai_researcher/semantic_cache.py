@@ -0,0 +1,140 @@
+import re
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+
+@lru_cache()
+def get_openai_client() -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=settings.openai_api_key or None)
+
+
+async def embed(texts: list[str]) -> np.ndarray:
+    """ Embed texts in one request, as unit-length rows so a dot product is their cosine similarity """
+    response = await get_openai_client().embeddings.create(model=settings.text_embedding_model, input=texts)
+    vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# Words capitalised only for starting the sentence
+OPENERS = {"what", "how", "why", "who", "when", "where", "which", "is", "are", "does", "do", "can", "the", "a", "an"}
+
+
+def salient_terms(text: str) -> frozenset[str]:
+    """ Numbers and capitalised words (names, tickers): details an embedding barely tells apart
+    ("Apple revenue 2023" vs "Apple revenue 2024") but that make a different query """
+    terms = set()
+    for word in re.findall(r"[\w$.-]+", text):
+        word = word.strip(".-")
+        if re.search(r"\d", word) or (re.search(r"[A-Z]", word) and word.lower() not in OPENERS):
+            terms.add(word.lower())
+    return frozenset(terms)
+
+
+class SemanticCache:
+    """ In-process vector index answering lookups with the value of the most similar unexpired entry
+
+    Entries live in one NumPy matrix, so a lookup is a single matrix-vector product over the whole cache.
+    A lookup by key only matches entries whose keys have the same salient terms.
+    """
+
+    def __init__(self, name: str, threshold: float, ttl: float, max_entries: int = 2000):
+        self.name = name
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.vectors: Optional[np.ndarray] = None
+        self.expires_at = np.empty(0)
+        self.keys: list[str] = []
+        self.terms: list[frozenset[str]] = []
+        self.values: list[Any] = []
+        self.hits = 0
+        self.misses = 0
+
+    def best_match(self, vector: np.ndarray, key: Optional[str]) -> tuple[int, float]:
+        """ Index and similarity of the closest unexpired entry, (-1, -1.0) for none """
+        if self.vectors is None or not self.keys:
+            return -1, -1.0
+        similarities = self.vectors @ vector
+        similarities[self.expires_at < time.time()] = -1.0
+        if key is not None:
+            terms = salient_terms(key)
+            similarities[[entry_terms != terms for entry_terms in self.terms]] = -1.0
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
+    def get(self, vector: np.ndarray, key: Optional[str] = None) -> Optional[Any]:
+        best, similarity = self.best_match(vector, key)
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        print(f"{self.name} cache hit: {self.keys[best]!r} (similarity {similarity:.3f})")
+        return self.values[best]
+
+    def put(self, key: str, vector: np.ndarray, value: Any) -> None:
+        """ Add an entry, or refresh the one a lookup of it would hit (e.g. stored meanwhile by a concurrent run) """
+        best, similarity = self.best_match(vector, key)
+        if similarity >= self.threshold:
+            self.vectors[best] = vector
+            self.expires_at[best] = time.time() + self.ttl
+            self.keys[best] = key
+            self.terms[best] = salient_terms(key)
+            self.values[best] = value
+            return
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+        self.expires_at = np.append(self.expires_at, time.time() + self.ttl)
+        self.keys.append(key)
+        self.terms.append(salient_terms(key))
+        self.values.append(value)
+        self.prune()
+
+    def prune(self) -> None:
+        """ Drop expired entries, then the oldest ones beyond max_entries """
+        keep = np.flatnonzero(self.expires_at >= time.time())[-self.max_entries :]
+        if len(keep) == len(self.keys):
+            return
+        self.vectors = self.vectors[keep]
+        self.expires_at = self.expires_at[keep]
+        self.keys = [self.keys[i] for i in keep]
+        self.terms = [self.terms[i] for i in keep]
+        self.values = [self.values[i] for i in keep]
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+@lru_cache()
+def get_plan_cache(kind: str = "fixed") -> SemanticCache:
+    """ Search plans, keyed by the research query, one cache per kind of planner """
+    return SemanticCache(
+        f"Plan ({kind})",
+        threshold=settings.research_plan_cache_threshold,
+        ttl=settings.research_plan_cache_ttl,
+        max_entries=settings.research_cache_max_entries,
+    )
+
+
+@lru_cache()
+def get_summary_cache() -> SemanticCache:
+    """ Search agent summaries, keyed by the search term """
+    return SemanticCache(
+        "Summary",
+        threshold=settings.research_summary_cache_threshold,
+        ttl=settings.research_summary_cache_ttl,
+        max_entries=settings.research_cache_max_entries,
+    )
@@ -1,10 +1,43 @@
+import asyncio
+
 import gradio as gr
 from research_manager import ResearchManager
 
+# The report streams in token by token, but re-rendering the Markdown more often than this is wasted work
+FPS = 10
+
 
 async def run(query: str):
-    async for chunk in ResearchManager().run(query):
-        yield chunk
+    # The research runs in its own task and only its latest output is kept; the UI picks that up once per frame
+    latest = None
+    finished = asyncio.Event()
+
+    async def consume():
+        nonlocal latest
+        try:
+            async for chunk in ResearchManager().run(query):
+                latest = chunk
+        finally:
+            finished.set()
+
+    task = asyncio.create_task(consume())
+    shown = None
+    try:
+        while True:
+            done = finished.is_set()
+            if latest is not shown:
+                shown = latest
+                yield shown
+            if done:
+                break
+            try:
+                await asyncio.wait_for(finished.wait(), 1 / FPS)
+            except asyncio.TimeoutError:
+                pass
+        # Surface errors raised by the research run
+        task.result()
+    finally:
+        task.cancel()
 
 
 with gr.Blocks(theme=gr.themes.Default(primary_hue="sky")) as ui:
@@ -12,8 +45,8 @@ with gr.Blocks(theme=gr.themes.Default(primary_hue="sky")) as ui:
     query_textbox = gr.Textbox(label="What topic would you like to research?")
     run_button = gr.Button("Run", variant="primary")
     report = gr.Markdown(label="Report")
-    
+
     run_button.click(fn=run, inputs=query_textbox, outputs=report)
     query_textbox.submit(fn=run, inputs=query_textbox, outputs=report)
 
-ui.launch(inbrowser=True)
\ No newline at end of file
+ui.launch(inbrowser=True)
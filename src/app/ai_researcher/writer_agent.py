@@ -26,4 +26,28 @@ writer_agent = Agent(
     instructions=INSTRUCTIONS,
     model=settings.openai_model,
     output_type=ReportData,
-)
\ No newline at end of file
+)
+
+REVISION_INSTRUCTIONS = (
+    "You are a senior researcher extending a draft report for a research query. "
+    "You will be provided with the original query, the draft report, and additional research "
+    "that arrived after the draft was written.\n"
+    "Write only a new section to append to the draft, covering what the additional research adds: new findings, "
+    "and corrections to any statement of the draft they contradict. Do not repeat what the draft already says. "
+    "The section should be in markdown format, start with a level 2 heading and be at most 400 words."
+)
+
+
+class ReportAddendum(BaseModel):
+    short_summary: str = Field(description="A short 2-3 sentence summary of the findings, including the new ones.")
+    markdown_section: str = Field(description="The section to append to the draft report")
+    follow_up_questions: list[str] = Field(description="Suggested topics to research further")
+
+
+# Used by the pipelined research run, which drafts from the first search results and appends the rest afterwards,
+# so the revision costs a short section rather than a second full report
+reviser_agent = writer_agent.clone(
+    name=AgentNames.REVISER_AGENT.value,
+    instructions=REVISION_INSTRUCTIONS,
+    output_type=ReportAddendum,
+)
@@ -0,0 +1,226 @@
+"""Offline benchmark of the Agents SDK pipelines: throughput, latency percentiles and orchestration overhead of the
+deep research run, the cold email collaboration and the handoff flow, at increasing numbers of concurrent runs.
+
+Every model call goes to a FakeModel with scripted outputs and a lognormal latency, so the numbers are repeatable
+and nothing touches the network. Model latency is spent sleeping, so the CPU time per run is what the orchestration
+(the SDK's run loop and our own code) costs; run with --latency 0 to see the wall time it adds on its own.
+
+    python -m src.app.benchmarks.agents_benchmark --concurrency 1 10 100 500 --latency 0.2 --sigma 0.5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from agents import set_tracing_disabled
+from agents.run import RunConfig
+
+from src.app.agent_workflows.simple_agent_collab import run_agent_collaboration, run_master_agent_with_handoffs
+from src.app.benchmarks.fake_model import FakeModel, FakeModelProvider, Latency, ScriptedPolicy, Turn
+from src.app.settings import get_settings
+
+# The research modules import their siblings by bare name, as they are run from their own directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ai_researcher"))
+
+from instrumentation import Tracer, format_summary  # noqa: E402
+from mailer import MailQueue  # noqa: E402
+from planner_agent import WebSearchItem, WebSearchPlan  # noqa: E402
+from research_manager import ResearchManager  # noqa: E402
+from writer_agent import ReportAddendum, ReportData  # noqa: E402
+
+settings = get_settings()
+
+SCENARIOS = ["research", "research-staged", "collaboration", "handoffs"]
+LOREM = (
+    "Scripted findings from the fake model describe the topic, its context and the main open questions. "
+    "They are long enough to look like a real answer to the code that parses, streams and forwards it. "
+)
+
+
+def scripted_policy(searches: int, report_words: int, summary_words: int) -> ScriptedPolicy:
+    def words(count: int) -> str:
+        text = LOREM * (count // len(LOREM.split()) + 1)
+        return " ".join(text.split()[:count])
+
+    def plan(turn: Turn) -> WebSearchPlan:
+        return WebSearchPlan(
+            searches=[WebSearchItem(reason=f"Aspect {i} of the query", query=f"search term {i}") for i in range(searches)]
+        )
+
+    def report(turn: Turn) -> ReportData:
+        sections = "\n\n".join(f"## Section {i}\n\n{words(report_words // 5)}" for i in range(5))
+        return ReportData(
+            short_summary=words(40),
+            markdown_report=f"# Report\n\n{sections}",
+            follow_up_questions=["What next?", "What else?"],
+        )
+
+    def addendum(turn: Turn) -> ReportAddendum:
+        return ReportAddendum(
+            short_summary=words(40),
+            markdown_section=f"## Later findings\n\n{words(report_words // 5)}",
+            follow_up_questions=["What next?"],
+        )
+
+    return ScriptedPolicy(
+        outputs={"WebSearchPlan": plan, "ReportData": report, "ReportAddendum": addendum},
+        text=lambda turn: words(summary_words),
+    )
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    concurrency: int
+    runs: int
+    wall: float
+    cpu: float
+    model_calls: int
+    latencies: list[float] = field(default_factory=list)
+    failures: int = 0
+    stages: dict[str, dict[str, float]] = field(default_factory=dict)
+
+    def row(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies) or [0.0]
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+        return {
+            "scenario": self.scenario,
+            "concurrency": self.concurrency,
+            "runs": self.runs,
+            "failures": self.failures,
+            "throughput": self.runs / self.wall if self.wall else 0.0,
+            "p50": quantiles[49],
+            "p95": quantiles[94],
+            "p99": quantiles[98],
+            "cpu_ms_per_run": 1000 * self.cpu / self.runs,
+            "model_calls_per_run": self.model_calls / self.runs,
+            "stages": self.stages,
+        }
+
+
+def scenario_run(name: str, run_config: RunConfig, tracer: Tracer, mail_queue: MailQueue) -> Callable[[int], Awaitable]:
+    async def research(index: int, pipelined: bool) -> None:
+        manager = ResearchManager(
+            pipelined=pipelined,
+            use_cache=False,
+            adaptive=False,
+            tracer=tracer,
+            mail_queue=mail_queue,
+            run_config=run_config,
+        )
+        async for _ in manager.run(f"benchmark query {index}"):
+            pass
+
+    if name == "research":
+        return lambda index: research(index, pipelined=True)
+    if name == "research-staged":
+        return lambda index: research(index, pipelined=False)
+    if name == "collaboration":
+        return lambda index: run_agent_collaboration(run_config=run_config)
+    if name == "handoffs":
+        return lambda index: run_master_agent_with_handoffs(run_config=run_config)
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+async def run_scenario(name: str, concurrency: int, runs: int, model: FakeModel) -> ScenarioResult:
+    run_config = RunConfig(model_provider=FakeModelProvider(model), tracing_disabled=True)
+    tracer = Tracer()
+    # A dry-run queue without a batch window, so emails cost their orchestration only
+    mail_queue = MailQueue("benchmark@localhost", batch_window=0.0)
+    run_once = scenario_run(name, run_config, tracer, mail_queue)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def timed(index: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await run_once(index)
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    calls_before = model.calls
+    cpu_before = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(index) for index in range(runs)))
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_before
+    mail_queue.close()
+    return ScenarioResult(
+        scenario=name,
+        concurrency=concurrency,
+        runs=runs,
+        wall=wall,
+        cpu=cpu,
+        model_calls=model.calls - calls_before,
+        latencies=latencies,
+        failures=failures,
+        stages=tracer.summary(),
+    )
+
+
+def print_header() -> None:
+    print(
+        f"{'scenario':<17}{'conc':>6}{'runs':>6}{'fail':>6}{'runs/s':>9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+        f"{'cpu ms/run':>12}{'calls/run':>11}"
+    )
+
+
+def print_row(row: dict[str, Any]) -> None:
+    print(
+        f"{row['scenario']:<17}{row['concurrency']:>6}{row['runs']:>6}{row['failures']:>6}{row['throughput']:>9.2f}"
+        f"{row['p50']:>8.2f}{row['p95']:>8.2f}{row['p99']:>8.2f}{row['cpu_ms_per_run']:>12.1f}"
+        f"{row['model_calls_per_run']:>11.1f}"
+    )
+
+
+async def main(args: argparse.Namespace) -> list[dict[str, Any]]:
+    policy = scripted_policy(args.searches, args.report_words, args.summary_words)
+    model = FakeModel(policy, Latency(args.latency, args.sigma), seed=args.seed)
+    rows = []
+    print_header()
+    for name in args.scenarios:
+        for concurrency in args.concurrency:
+            # The pipelines print their progress; at hundreds of concurrent runs that would swamp the results
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = await run_scenario(name, concurrency, max(concurrency, args.runs), model)
+            rows.append(result.row())
+            print_row(rows[-1])
+            if result.stages and args.stages:
+                print(format_summary(result.stages))
+                print_header()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipelines against a fake model")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 100, 500])
+    parser.add_argument("--runs", type=int, default=20, help="Runs per level, at least the level's concurrency")
+    parser.add_argument("--latency", type=float, default=0.2, help="Median model call latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread of the lognormal latency, 0 for constant")
+    parser.add_argument("--searches", type=int, default=settings.research_how_many_searches)
+    parser.add_argument("--report-words", type=int, default=1000)
+    parser.add_argument("--summary-words", type=int, default=250)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", action="store_true", help="Also print the research stage latencies")
+    parser.add_argument("--json", type=Path, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Nothing may reach the network, the traces included
+    set_tracing_disabled(True)
+    rows = asyncio.run(main(args))
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=2), encoding="utf-8")
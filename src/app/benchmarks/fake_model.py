@@ -0,0 +1,258 @@
+"""A local stand-in for the OpenAI models behind the Agents SDK, for exercising agent pipelines without the network.
+
+FakeModelProvider plugs into Runner.run through RunConfig(model_provider=...). Its model answers every call from a
+ScriptedPolicy after a sampled latency: agents with function tools call each of them once (in parallel), then take
+their first handoff if they have one, and finally answer with text or, for agents with an output_type, with JSON
+for that type from a registered factory or a generic filler built from the type's JSON schema.
+"""
+
+import asyncio
+import json
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional
+
+from agents.agent_output import AgentOutputSchemaBase
+from agents.handoffs import Handoff
+from agents.items import ModelResponse, TResponseInputItem, TResponseStreamEvent
+from agents.model_settings import ModelSettings
+from agents.models.interface import Model, ModelProvider, ModelTracing
+from agents.tool import FunctionTool, Tool
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from pydantic import BaseModel
+
+
+@dataclass
+class Latency:
+    """ Lognormal model call latency around median seconds; sigma 0 makes it constant """
+
+    median: float = 0.0
+    sigma: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median if self.sigma <= 0 else rng.lognormvariate(0.0, self.sigma) * self.median
+
+
+@dataclass
+class Turn:
+    """ What the model is asked on one call """
+
+    system_instructions: Optional[str]
+    input: str | list[TResponseInputItem]
+    tools: list[Tool]
+    handoffs: list[Handoff]
+    output_schema: Optional[AgentOutputSchemaBase]
+
+    def called(self) -> set[str]:
+        """ Names of the tools and handoffs already called in the conversation so far """
+        if isinstance(self.input, str):
+            return set()
+        items = [item for item in self.input if isinstance(item, dict)]
+        return {item.get("name") for item in items if item.get("type") == "function_call"}
+
+
+def fill_schema(schema: dict[str, Any], defs: Optional[dict[str, Any]] = None) -> Any:
+    """ A minimal value matching a JSON schema: placeholder strings, zeros and single-item arrays """
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fill_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return fill_schema(options[0], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fill_schema(prop, defs) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fill_schema(schema.get("items", {}), defs)]
+    if kind == "integer":
+        return 0
+    if kind == "number":
+        return 0.0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return "placeholder"
+
+
+@dataclass
+class ScriptedPolicy:
+    """ Decides each model reply
+
+    outputs maps an output type's name (e.g. "WebSearchPlan") to a factory of its value, which must match the type's
+    JSON schema as the SDK sees it (non-object types are wrapped as {"response": ...}). text answers plain text turns.
+    """
+
+    outputs: dict[str, Callable[[Turn], BaseModel | dict[str, Any]]] = field(default_factory=dict)
+    text: Callable[[Turn], str] = lambda turn: "A scripted reply from the fake model."
+
+    def respond(self, turn: Turn) -> list[Any]:
+        called = turn.called()
+        function_tools = [tool for tool in turn.tools if isinstance(tool, FunctionTool) and tool.name not in called]
+        if function_tools:
+            return [tool_call(tool.name, fill_schema(tool.params_json_schema)) for tool in function_tools]
+        if turn.handoffs and not called & {handoff.tool_name for handoff in turn.handoffs}:
+            return [tool_call(turn.handoffs[0].tool_name, {})]
+        return [message(self.final_output(turn))]
+
+    def final_output(self, turn: Turn) -> str:
+        if turn.output_schema is None or turn.output_schema.is_plain_text():
+            return self.text(turn)
+        factory = self.outputs.get(turn.output_schema.name())
+        value = factory(turn) if factory else fill_schema(turn.output_schema.json_schema())
+        if isinstance(value, BaseModel):
+            value = value.model_dump(mode="json")
+        return json.dumps(value)
+
+
+def tool_call(name: str, arguments: dict[str, Any]) -> ResponseFunctionToolCall:
+    return ResponseFunctionToolCall(
+        id=f"fc_{uuid.uuid4().hex}",
+        call_id=f"call_{uuid.uuid4().hex}",
+        type="function_call",
+        name=name,
+        arguments=json.dumps(arguments),
+        status="completed",
+    )
+
+
+def message(text: str) -> ResponseOutputMessage:
+    return ResponseOutputMessage(
+        id=f"msg_{uuid.uuid4().hex}",
+        type="message",
+        role="assistant",
+        status="completed",
+        content=[ResponseOutputText(type="output_text", text=text, annotations=[])],
+    )
+
+
+def count_tokens(value: Any) -> int:
+    # Roughly 4 characters a token, as for the rate limiter's estimates
+    return max(1, len(value if isinstance(value, str) else json.dumps(value, default=str)) // 4)
+
+
+class FakeModel(Model):
+    """ Replies from a ScriptedPolicy after a sampled latency; streamed replies spread it over chunks of text """
+
+    def __init__(
+        self,
+        policy: Optional[ScriptedPolicy] = None,
+        latency: Optional[Latency] = None,
+        seed: Optional[int] = None,
+        first_token_share: float = 0.3,
+        chunk_size: int = 64,
+    ):
+        self.policy = policy or ScriptedPolicy()
+        self.latency = latency or Latency()
+        self.rng = random.Random(seed)
+        self.first_token_share = first_token_share
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def reply(self, system_instructions, input, tools, output_schema, handoffs) -> tuple[list[Any], Usage]:
+        self.calls += 1
+        output = self.policy.respond(Turn(system_instructions, input, tools, handoffs, output_schema))
+        input_tokens = count_tokens(system_instructions or "") + count_tokens(input)
+        output_tokens = sum(count_tokens(item.model_dump()) for item in output)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        usage = Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens)
+        usage.total_tokens = input_tokens + output_tokens
+        return output, usage
+
+    async def get_response(
+        self,
+        system_instructions: Optional[str],
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: Optional[AgentOutputSchemaBase],
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        **kwargs: Any,
+    ) -> ModelResponse:
+        output, usage = self.reply(system_instructions, input, tools, output_schema, handoffs)
+        await asyncio.sleep(self.latency.sample(self.rng))
+        return ModelResponse(output=output, usage=usage, response_id=f"resp_{uuid.uuid4().hex}")
+
+    async def stream_response(
+        self,
+        system_instructions: Optional[str],
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: Optional[AgentOutputSchemaBase],
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        **kwargs: Any,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        output, usage = self.reply(system_instructions, input, tools, output_schema, handoffs)
+        latency = self.latency.sample(self.rng)
+        await asyncio.sleep(latency * self.first_token_share)
+
+        sequence_number = 0
+        for index, item in enumerate(output):
+            if not isinstance(item, ResponseOutputMessage):
+                continue
+            text = item.content[0].text
+            chunks = [text[start : start + self.chunk_size] for start in range(0, len(text), self.chunk_size)]
+            for chunk in chunks:
+                yield ResponseTextDeltaEvent.model_construct(
+                    type="response.output_text.delta",
+                    item_id=item.id,
+                    output_index=index,
+                    content_index=0,
+                    delta=chunk,
+                    logprobs=[],
+                    sequence_number=sequence_number,
+                )
+                sequence_number += 1
+                await asyncio.sleep(latency * (1 - self.first_token_share) / len(chunks))
+
+        response = Response.model_construct(
+            id=f"resp_{uuid.uuid4().hex}",
+            object="response",
+            created_at=0,
+            model="fake",
+            output=output,
+            parallel_tool_calls=True,
+            tool_choice="auto",
+            tools=[],
+            usage=ResponseUsage.model_construct(
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                total_tokens=usage.total_tokens,
+                input_tokens_details=usage.input_tokens_details,
+                output_tokens_details=usage.output_tokens_details,
+            ),
+        )
+        yield ResponseCompletedEvent.model_construct(
+            type="response.completed", response=response, sequence_number=sequence_number
+        )
+
+
+class FakeModelProvider(ModelProvider):
+    """ Serves the same FakeModel for every model name, so its counters cover a whole pipeline """
+
+    def __init__(self, model: Optional[FakeModel] = None):
+        self.model = model or FakeModel()
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return self.model
@@ -1,8 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# One keep-alive session for every push, retrying connection errors, 429s and 5xxs with exponential backoff
+session = requests.Session()
+session.mount(
+    "https://",
+    HTTPAdapter(
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            backoff_jitter=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,
+            respect_retry_after_header=True,
+        )
+    ),
+)
+# A single background sender, so the crew doesn't wait on the Pushover API (and pushes stay in order)
+sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="push")
+
+
+def send(message: str) -> None:
+    payload = {
+        "user": os.getenv("PUSHOVER_USER"),
+        "token": os.getenv("PUSHOVER_TOKEN"),
+        "message": message,
+    }
+    try:
+        response = session.post(os.getenv("PUSHOVER_API"), data=payload, timeout=10)
+        if response.status_code != 200:
+            print(f"Failed to send notification: {response.text}")
+    except requests.RequestException as e:
+        print(f"Failed to send notification: {e}")
 
 
 class PushNotificationInput(BaseModel):
@@ -17,11 +53,6 @@ class PushNotificationTool(BaseTool):
     args_schema: Type[BaseModel] = PushNotificationInput
 
     def _run(self, message: str) -> str:
-        pushover_user = os.getenv("PUSHOVER_USER")
-        pushover_token = os.getenv("PUSHOVER_TOKEN")
-        pushover_api = os.getenv("PUSHOVER_API")
-
         print(f"Push: {message}")
-        payload = {"user": pushover_user, "token": pushover_token, "message": message}
-        requests.post(pushover_api, data=payload)
+        sender.submit(send, message)
         return '{"notification": "ok"}'
@@ -1,10 +1,12 @@
+import hashlib
 import json
+import os
 from pathlib import Path
 
-import requests
 from openai import OpenAI
 from pypdf import PdfReader
 
+from src.app.notifications import notify
 from src.app.settings import get_settings
 
 SCRIPT_DIR = Path(__file__).parent
@@ -13,17 +15,11 @@ setting = get_settings()
 openai = OpenAI(api_key=setting.openai_api_key)
 
 def push(message: str):
-    payload = {
-        "user": setting.pushover_user,
-        "token": setting.pushover_token,
-        "message": message,
-    }
-    response = requests.post(setting.pushover_api, data=payload)
-    if response.status_code != 200:
-        print(f"Failed to send notification: {response.text}")
+    # Queued and sent in the background; failures are logged and dead-lettered there
+    notify(message)
 
 
-def record_user_details(email: str, name: str, notes: str):
+def record_user_details(email: str, name: str = "Name not provided", notes: str = "not provided"):
     push(f"Recording user details: {email}, {name} and notes: {notes}")
 
     return {"recorded": "OK"}
@@ -81,26 +77,48 @@ tools = [
     {"type": "function", "function": record_unknown_question_json},
 ]
 
-# in python we can access globals() to get a reference to the function by name, which is how we can dynamically call the tool function based on the tool call from the LLM
-# example globals()["record_user_details"]("some questions") will give us a reference to the record_user_details function that we can then call with the arguments from the tool call
+# Only these functions can be called by name from a tool call; the model never gets to pick an arbitrary global
+TOOL_FUNCTIONS = {
+    "record_user_details": record_user_details,
+    "record_unknown_question": record_unknown_question,
+}
+
+
+def call_tool(tool_name: str, arguments: str, tool_call_id: str) -> dict:
+    """ Run one tool call; an unknown tool or a failing call comes back to the model as an error result """
+    print(f"Tool called: {tool_name}", flush=True)
+    tool = TOOL_FUNCTIONS.get(tool_name)
+    try:
+        if tool is None:
+            raise ValueError(f"Unknown tool {tool_name!r}")
+        result = tool(**json.loads(arguments or "{}"))
+    except Exception as e:
+        print(f"Tool {tool_name} failed: {e!r}", flush=True)
+        result = {"error": str(e)}
+    return {"role": "tool", "content": json.dumps(result), "tool_call_id": tool_call_id}
+
+
 def handle_tool_calls(tool_calls):
-    results = []
-    for tool_call in tool_calls:
-        tool_name = tool_call.function.name
-        arguments = json.loads(tool_call.function.arguments)
-        print(f"Tool called: {tool_name}", flush=True)
-        tool = globals().get(tool_name)
-        result = tool(**arguments) if tool else {}
-        results.append({"role": "tool","content": json.dumps(result),"tool_call_id": tool_call.id})
+    return [call_tool(tool_call.function.name, tool_call.function.arguments, tool_call.id) for tool_call in tool_calls]
 
-    return results
 
+def extract_pdf_text(path: Path) -> str:
+    """The text of a PDF, cached by the file's content hash so an unchanged file is only parsed once"""
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    cache_dir = Path(setting.profile_cache_dir)
+    cached = cache_dir / f"{digest}.txt"
+    if cached.exists():
+        return cached.read_text(encoding="utf-8")
 
-linkedin = ""
-for page in PdfReader(SCRIPT_DIR / "resume.pdf").pages:
-    text = page.extract_text()
-    if text:
-        linkedin += text
+    text = "".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, cached)
+    return text
+
+
+linkedin = extract_pdf_text(SCRIPT_DIR / "resume.pdf")
 
 with open(SCRIPT_DIR / "summary.txt", "r", encoding="utf-8") as f:
     summary = f.read()
@@ -118,17 +136,23 @@ If the user is engaging in discussion, try to steer them towards getting in touc
 system_prompt += f"\n\n## Summary:\n{summary}\n\n## LinkedIn Profile:\n{linkedin}\n\n"
 system_prompt += f"With this context, please chat with the user, always staying in character as {name}."
 
+# Built once: every request starts with the same tools and system message, byte for byte, so the provider can serve
+# that long prefix from its prompt cache. The cache key routes requests sharing the prefix to the same cache.
+system_message = {"role": "system", "content": system_prompt}
+prompt_cache_key = "profile-" + hashlib.sha256(json.dumps([tools, system_prompt]).encode()).hexdigest()[:16]
+
 
 def chat(message, history):
-    messages = (
-        [{"role": "system", "content": system_prompt}]
-        + history
-        + [{"role": "user", "content": message}]
-    )
+    messages = [system_message, *history, {"role": "user", "content": message}]
     done = False
     while not done:
         # This is the call to the LLM - see that we pass in the tools json
-        response = openai.chat.completions.create(messages=messages, model=setting.openai_model, tools=tools)
+        response = openai.chat.completions.create(
+            messages=messages, model=setting.openai_model, tools=tools, prompt_cache_key=prompt_cache_key
+        )
+        usage = response.usage
+        if usage and usage.prompt_tokens_details:
+            print(f"Input tokens: {usage.prompt_tokens}, cached: {usage.prompt_tokens_details.cached_tokens}", flush=True)
 
         finish_reason = response.choices[0].finish_reason
 
@@ -145,14 +169,16 @@ def chat(message, history):
 
     return response.choices[0].message.content
 
-chat_history = []
-while True:
-    user_input = input("User: ")
-    if user_input.lower() in ["exit", "quit"]:
-        break
 
-    response = chat(user_input, chat_history)
-    print(f"{name}: {response}")
-    chat_history.append({"role": "user", "content": user_input})
-    chat_history.append({"role": "assistant", "content": response})
+if __name__ == "__main__":
+    chat_history = []
+    while True:
+        user_input = input("User: ")
+        if user_input.lower() in ["exit", "quit"]:
+            break
+
+        response = chat(user_input, chat_history)
+        print(f"{name}: {response}")
+        chat_history.append({"role": "user", "content": user_input})
+        chat_history.append({"role": "assistant", "content": response})
 
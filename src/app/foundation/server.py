@@ -0,0 +1,213 @@
+"""The profile chat bot of main.py as an async HTTP service, for many users at once.
+
+    uvicorn src.app.foundation.server:app --host 0.0.0.0 --port 8000
+
+POST /chat with {"message": ..., "session_id": ...} streams the reply as plain text; the session id to send with the
+next message comes back in the X-Session-Id header. Leave session_id out (or send an expired one) to start a new
+conversation.
+"""
+
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from pydantic import BaseModel, Field
+
+from src.app.foundation.main import call_tool, prompt_cache_key, system_message, tools
+from src.app.settings import get_settings
+
+setting = get_settings()
+
+
+@lru_cache(maxsize=1)
+def get_async_openai() -> AsyncOpenAI:
+    """ One client for the whole process, so every request reuses its pool of keep-alive connections """
+    return AsyncOpenAI(
+        api_key=setting.openai_api_key,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=setting.openai_max_connections,
+                max_keepalive_connections=setting.openai_max_keepalive_connections,
+            )
+        ),
+    )
+
+
+@dataclass
+class Session:
+    history: list[dict] = field(default_factory=list)
+    # One reply at a time per session, so concurrent messages from the same user don't interleave in the history
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_seen: float = field(default_factory=time.monotonic)
+
+
+class SessionStore:
+    """ Chat histories by session id, bounded by count (least recently used first out), idle time and length """
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 3600.0, max_history: int = 40):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history = max_history
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        self.evicted = 0
+
+    def get(self, session_id: Optional[str]) -> tuple[str, Session]:
+        """ The session with this id, or a new one under a new id when it is unknown or has expired """
+        self.expire()
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session_id = secrets.token_urlsafe(16)
+            session = self.sessions[session_id] = Session()
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+        self.sessions.move_to_end(session_id)
+        session.last_seen = time.monotonic()
+        return session_id, session
+
+    def expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        # Oldest first, so stop at the first session that is still live
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_seen >= cutoff:
+                break
+            del self.sessions[session_id]
+            self.evicted += 1
+
+    def append(self, session: Session, user_message: str, reply: str) -> None:
+        session.history.append({"role": "user", "content": user_message})
+        session.history.append({"role": "assistant", "content": reply})
+        # Dropped in user/assistant pairs, so the history always starts with a user message
+        excess = len(session.history) - self.max_history
+        if excess > 0:
+            del session.history[: excess + excess % 2]
+
+    def delete(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+
+sessions = SessionStore(
+    setting.profile_chat_max_sessions, setting.profile_chat_session_ttl, setting.profile_chat_max_history
+)
+
+
+async def run_tool_calls(tool_calls: list[dict]) -> list[dict]:
+    """ The tool calls of one turn, run concurrently; the tools are blocking functions, so each gets a thread """
+    return await asyncio.gather(
+        *(
+            asyncio.to_thread(call_tool, tool_call["function"]["name"], tool_call["function"]["arguments"], tool_call["id"])
+            for tool_call in tool_calls
+        )
+    )
+
+
+async def chat_stream(message: str, history: list[dict], reply: list[str]) -> AsyncIterator[str]:
+    """ Like main.chat, streaming the reply as it is generated; the text streamed is also collected in reply """
+    messages = [system_message, *history, {"role": "user", "content": message}]
+    rounds = setting.profile_chat_max_tool_rounds
+    for round_ in range(rounds + 1):
+        # After the last round of tool calls the model has to answer with what it has found so far
+        last = round_ == rounds
+        stream = await get_async_openai().chat.completions.create(
+            messages=messages,
+            model=setting.openai_model,
+            tools=tools,
+            tool_choice="none" if last else "auto",
+            prompt_cache_key=prompt_cache_key,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        content: list[str] = []
+        tool_calls: dict[int, dict] = {}
+        finish_reason = None
+        async for chunk in stream:
+            if chunk.usage and chunk.usage.prompt_tokens_details:
+                usage = chunk.usage
+                print(f"Input tokens: {usage.prompt_tokens}, cached: {usage.prompt_tokens_details.cached_tokens}", flush=True)
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            if choice.delta.content:
+                content.append(choice.delta.content)
+                reply.append(choice.delta.content)
+                yield choice.delta.content
+            # Tool calls arrive in fragments: the id and name first, then the arguments a piece at a time
+            for delta in choice.delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(
+                    delta.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+                )
+                if delta.id:
+                    tool_call["id"] = delta.id
+                if delta.function and delta.function.name:
+                    tool_call["function"]["name"] += delta.function.name
+                if delta.function and delta.function.arguments:
+                    tool_call["function"]["arguments"] += delta.function.arguments
+
+        if finish_reason != "tool_calls" or last:
+            return
+        calls = [tool_calls[index] for index in sorted(tool_calls)]
+        messages.append({"role": "assistant", "content": "".join(content) or None, "tool_calls": calls})
+        messages.extend(await run_tool_calls(calls))
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(min_length=1, max_length=4000)
+    session_id: Optional[str] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await get_async_openai().close()
+
+
+app = FastAPI(title="Profile chat", lifespan=lifespan)
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest) -> StreamingResponse:
+    session_id, session = sessions.get(request.session_id)
+
+    async def body() -> AsyncIterator[str]:
+        async with session.lock:
+            reply: list[str] = []
+            try:
+                async for text in chat_stream(request.message, list(session.history), reply):
+                    yield text
+            except Exception as e:
+                # Headers are already sent, so the failure can only be reported in the body
+                print(f"Chat failed for session {session_id}: {e!r}", flush=True)
+                yield "Sorry, something went wrong. Please try again."
+                return
+            # Only a reply that streamed in full goes into the history; a disconnect mid-stream never gets here
+            sessions.append(session, request.message, "".join(reply))
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8", headers={"X-Session-Id": session_id})
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str) -> None:
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+
+
+@app.get("/health")
+async def health() -> dict:
+    return {"status": "ok", "sessions": len(sessions.sessions), "evicted": sessions.evicted}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000)
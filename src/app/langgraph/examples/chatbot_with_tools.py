@@ -1,7 +1,6 @@
 from typing import TypedDict
 
 import gradio as gr
-import requests
 from langchain_community.utilities import GoogleSerperAPIWrapper
 from langchain_core.tools import Tool
 from langchain_openai import ChatOpenAI
@@ -14,6 +13,7 @@ import sqlite3
 from pathlib import Path
 #from langgraph.checkpoint.memory import MemorySaver
 
+from src.app.notifications import notify
 from src.app.settings import get_settings
 
 settings = get_settings()
@@ -28,14 +28,7 @@ tool_search = Tool(
 
 def push(text: str):
     """Send a push notification to the user"""
-    requests.post(
-        settings.pushover_api,
-        data={
-            "token": settings.pushover_token,
-            "user": settings.pushover_user,
-            "message": text,
-        },
-    )
+    notify(text)
 tool_push = Tool(
     name="send_push_notification",
     func=push,
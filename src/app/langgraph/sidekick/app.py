@@ -1,41 +1,61 @@
+import signal
+import threading
+
 import gradio as gr
-from src.app.langgraph.sidekick.sidekick import Sidekick
+from src.app.langgraph.sidekick.manager import AdmissionError, get_sidekick_manager
 
 from src.app.settings import get_settings
 
 settings = get_settings()
 
+manager = get_sidekick_manager()
+
 
-async def setup():
-    sidekick = Sidekick()
-    await sidekick.setup()
-    return sidekick
+def user_key(request: gr.Request) -> str:
+    # Quotas are per signed-in user, or per client address when the app runs without auth
+    if request is None:
+        return "anonymous"
+    return request.username or (request.client.host if request.client else None) or request.session_hash
 
 
-async def process_message(sidekick: Sidekick, message, success_criteria, history):
-    if sidekick:
-        results = await sidekick.run_superstep(message, success_criteria, history)
-        return results, sidekick
-    return history, sidekick
+async def setup(request: gr.Request):
+    try:
+        return await manager.open_session(user_key(request))
+    except AdmissionError as e:
+        raise gr.Error(str(e))
 
 
-async def reset():
-    new_sidekick = Sidekick()
-    await new_sidekick.setup()
-    return "", "", None, new_sidekick
+async def process_message(session_id: str, message, success_criteria, history, request: gr.Request):
+    if not session_id:
+        yield history, session_id
+        return
+    try:
+        async for results in manager.run_superstep(user_key(request), session_id, message, success_criteria, history):
+            yield results, session_id
+    except AdmissionError as e:
+        raise gr.Error(str(e))
+
 
+async def reset(session_id: str, request: gr.Request):
+    # Abort any runaway superstep and release the old Sidekick before starting afresh
+    if session_id:
+        manager.cancel(session_id, user_key(request))
+        await manager.close_session(session_id, user_key(request))
+    return "", "", None, await setup(request)
 
-def free_resources(sidekick: Sidekick):
+
+def free_resources(session_id: str):
     print("Cleaning up")
     try:
-        if sidekick:
-            sidekick.cleanup()
+        if session_id:
+            manager.close_session_threadsafe(session_id)
     except Exception as e:
         print(f"Exception during cleanup: {e}")
 
 
 with gr.Blocks(title="Sidekick", theme=gr.themes.Default(primary_hue="emerald")) as ui:
     gr.Markdown("##Personal Co-Worker")
+    # Holds the id of this tab's session, the manager owns the Sidekick itself
     sidekick = gr.State(delete_callback=free_resources)
 
     with gr.Row():
@@ -53,23 +73,44 @@ with gr.Blocks(title="Sidekick", theme=gr.themes.Default(primary_hue="emerald"))
         reset_button = gr.Button("Reset", variant="stop")
         go_button = gr.Button("Go!", variant="primary")
 
-    ui.load(setup, [], [sidekick])
-    message.submit(
+    # Gradio would otherwise run one call of each listener at a time; the manager does the admission control
+    ui.load(setup, [], [sidekick], concurrency_limit=None)
+    message_event = message.submit(
         process_message,
         [sidekick, message, success_criteria, chatbot],
         [chatbot, sidekick],
+        concurrency_limit=None,
     )
-    success_criteria.submit(
+    success_criteria_event = success_criteria.submit(
         process_message,
         [sidekick, message, success_criteria, chatbot],
         [chatbot, sidekick],
+        concurrency_limit=None,
     )
-    go_button.click(
+    go_event = go_button.click(
         process_message,
         [sidekick, message, success_criteria, chatbot],
         [chatbot, sidekick],
+        concurrency_limit=None,
+    )
+    reset_button.click(
+        reset,
+        [sidekick],
+        [message, success_criteria, chatbot, sidekick],
+        cancels=[message_event, success_criteria_event, go_event],
     )
-    reset_button.click(reset, [], [message, success_criteria, chatbot, sidekick])
 
 
-ui.launch(inbrowser=True)
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+# Serve from a background thread so the main thread can drain the manager before the server's loop goes away
+signal.signal(signal.SIGTERM, stop)
+ui.launch(inbrowser=True, prevent_thread_lock=True)
+try:
+    threading.Event().wait()
+except KeyboardInterrupt:
+    print("Draining Sidekicks")
+    manager.shutdown(settings.sidekick_drain_timeout)
+    ui.close()
@@ -0,0 +1,122 @@
+"""Concurrent-session throughput of the Sidekick graph with blocking vs async nodes.
+
+Both variants run the same worker -> evaluator superstep against local fake chat models that simply sleep for
+the configured latency, so the numbers only reflect how many supersteps one process can keep in flight.
+
+    python -m src.app.langgraph.sidekick.benchmark --sessions 50 100 200 --latency 0.5
+
+It first checks that supersteps of two sessions overlap when run through the SidekickManager, as the app runs them.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict
+
+# The fake models never leave the process, but importing the Sidekick tools builds a Serper wrapper that insists on a key
+os.environ.setdefault("SERPER_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.app.langgraph.sidekick.checkpointer import BoundedMemorySaver
+from src.app.langgraph.sidekick.manager import SidekickManager
+from src.app.langgraph.sidekick.sidekick import EvaluatorOutput, Sidekick, State
+
+
+def fake_model(latency: float, respond: Callable[[], Any]) -> RunnableLambda:
+    """A stand-in for a chat model: sync calls block the thread, async calls yield to the loop"""
+
+    def invoke(messages):
+        time.sleep(latency)
+        return respond()
+
+    async def ainvoke(messages):
+        await asyncio.sleep(latency)
+        return respond()
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+class BlockingSidekick(Sidekick):
+    """The Sidekick before async nodes: every LLM round trip holds a thread-pool slot for its full latency"""
+
+    def worker(self, state: State) -> Dict[str, Any]:
+        return {"messages": [self.worker_llm_with_tools.invoke(self.worker_messages(state))]}
+
+    def evaluator(self, state: State) -> Dict[str, Any]:
+        messages, update = self.prepare_evaluation(state)
+        return {**update, **self.evaluation_update(self.evaluator_llm_with_output.invoke(messages))}
+
+
+async def build_sidekick(sidekick_class: type[Sidekick], latency: float) -> Sidekick:
+    sidekick = sidekick_class()
+    sidekick.memory = BoundedMemorySaver()
+    sidekick.tools = []
+    sidekick.worker_llm_with_tools = fake_model(latency, lambda: AIMessage(content="Paris is the capital of France"))
+    sidekick.evaluator_llm_with_output = fake_model(
+        latency,
+        lambda: EvaluatorOutput(feedback="Looks good", success_criteria_met=True, user_input_needed=False),
+    )
+    await sidekick.build_graph()
+    return sidekick
+
+
+async def check_manager_overlap(latency: float) -> float:
+    """Run one superstep in each of two sessions through the manager at once, returning the elapsed time
+
+    Each superstep takes two model calls; when they overlap the pair finishes in about one superstep's time.
+    """
+
+    class FakeSidekick(Sidekick):
+        async def setup(self):
+            fake = await build_sidekick(Sidekick, latency)
+            self.memory, self.tools = fake.memory, fake.tools
+            self.worker_llm_with_tools = fake.worker_llm_with_tools
+            self.evaluator_llm_with_output = fake.evaluator_llm_with_output
+            await self.build_graph()
+
+    manager = SidekickManager(sidekick_factory=FakeSidekick)
+    try:
+        sessions = [await manager.open_session(user) for user in ("alice", "bob")]
+
+        async def superstep(user: str, session_id: str) -> None:
+            async for _ in manager.run_superstep(user, session_id, "What is the capital of France?", None, []):
+                pass
+
+        start = time.perf_counter()
+        await asyncio.gather(*[superstep(user, session_id) for user, session_id in zip(("alice", "bob"), sessions)])
+        elapsed = time.perf_counter() - start
+    finally:
+        await manager.drain(timeout=1.0)
+    if elapsed >= 3 * latency:
+        raise RuntimeError(f"Supersteps of two sessions took {elapsed:.2f}s, they ran one after the other")
+    return elapsed
+
+
+async def measure(sidekick_class: type[Sidekick], sessions: int, latency: float) -> float:
+    sidekicks = [await build_sidekick(sidekick_class, latency) for _ in range(sessions)]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[sidekick.run_superstep("What is the capital of France?", None, []) for sidekick in sidekicks]
+    )
+    return time.perf_counter() - start
+
+
+async def main(sessions: list[int], latency: float):
+    print(f"Fake model latency: {latency}s per call, 2 calls per superstep")
+    print(f"Two sessions through the manager overlap: {await check_manager_overlap(latency):.2f}s for both")
+    print(f"{'nodes':<10}{'sessions':>10}{'elapsed (s)':>14}{'supersteps/s':>15}")
+    for count in sessions:
+        for label, sidekick_class in (("blocking", BlockingSidekick), ("async", Sidekick)):
+            elapsed = await measure(sidekick_class, count, latency)
+            print(f"{label:<10}{count:>10}{elapsed:>14.2f}{count / elapsed:>15.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Sidekick supersteps")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.latency))
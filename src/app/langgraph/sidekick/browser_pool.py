@@ -0,0 +1,241 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Playwright,
+    async_playwright,
+)
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+
+class ContextBoundBrowser(Browser):
+    """A view of a pooled browser that only exposes one leased context"""
+
+    # The LangChain Playwright tools always drive browser.contexts[0] (creating it if missing), so handing them
+    # the shared browser directly would make every session share one context. This wrapper points them at the lease.
+    def __init__(self, browser: Browser, context: BrowserContext):
+        super().__init__(browser._impl_obj)
+        self._leased_context = context
+
+    @property
+    def contexts(self) -> List[BrowserContext]:
+        return [self._leased_context]
+
+    async def new_context(self, **kwargs) -> BrowserContext:
+        return self._leased_context
+
+    async def close(self, **kwargs) -> None:
+        # The pool owns the real browser, tools must not be able to close it for everyone else
+        pass
+
+
+@dataclass
+class PooledBrowser:
+    browser: Browser
+    leases: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser.is_connected()
+
+
+@dataclass
+class BrowserLease:
+    pool: "BrowserPool"
+    pooled: PooledBrowser
+    context: BrowserContext
+    browser: ContextBoundBrowser
+    released: bool = False
+
+    async def release(self) -> None:
+        await self.pool.release(self)
+
+
+class BrowserPool:
+    """Process-wide set of warm headless Chromium browsers handing out isolated contexts"""
+
+    def __init__(
+        self,
+        max_browsers: int = 2,
+        max_contexts_per_browser: int = 10,
+        warm_browsers: int = 1,
+        idle_timeout: float = 300.0,
+        reap_interval: float = 30.0,
+        headless: bool = True,
+    ):
+        self.max_browsers = max_browsers
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.warm_browsers = min(warm_browsers, max_browsers)
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.headless = headless
+        self.playwright: Optional[Playwright] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.browsers: List[PooledBrowser] = []
+        self.launching = 0
+        self.condition = asyncio.Condition()
+        self.start_lock = asyncio.Lock()
+        self.reaper: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        async with self.start_lock:
+            if self.playwright:
+                return
+            self.loop = asyncio.get_running_loop()
+            self.playwright = await async_playwright().start()
+            for _ in range(self.warm_browsers):
+                self.browsers.append(PooledBrowser(await self.launch()))
+            self.reaper = asyncio.create_task(self.reap_forever())
+
+    async def launch(self) -> Browser:
+        # Runs Chromium in headless mode (no display required — needed in dev containers / servers without an X server)
+        return await self.playwright.chromium.launch(headless=self.headless)
+
+    def pick(self) -> Optional[PooledBrowser]:
+        candidates = [
+            pooled
+            for pooled in self.browsers
+            if pooled.healthy and pooled.leases < self.max_contexts_per_browser
+        ]
+        if not candidates:
+            return None
+        # Pack contexts onto the busiest browser with room, so the others go idle and can be evicted
+        return max(candidates, key=lambda pooled: pooled.leases)
+
+    async def lease(self, timeout: Optional[float] = None) -> BrowserLease:
+        """ Lease an isolated browser context, waiting up to timeout seconds if the pool is at capacity """
+        await self.start()
+        async with self.condition:
+            pooled = None
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                pooled = self.pick()
+                if pooled:
+                    pooled.leases += 1
+                    break
+                if len(self.browsers) + self.launching < self.max_browsers:
+                    # Reserve a browser slot and launch it outside the lock
+                    self.launching += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a browser context")
+                try:
+                    await asyncio.wait_for(self.condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    raise TimeoutError("Timed out waiting for a browser context")
+
+        if pooled is None:
+            try:
+                pooled = PooledBrowser(await self.launch(), leases=1)
+            finally:
+                async with self.condition:
+                    self.launching -= 1
+                    if pooled:
+                        self.browsers.append(pooled)
+                    self.condition.notify_all()
+
+        try:
+            context = await pooled.browser.new_context()
+        except Exception:
+            await self.give_back(pooled)
+            raise
+        return BrowserLease(
+            pool=self,
+            pooled=pooled,
+            context=context,
+            browser=ContextBoundBrowser(pooled.browser, context),
+        )
+
+    async def release(self, lease: BrowserLease) -> None:
+        if lease.released:
+            return
+        lease.released = True
+        try:
+            await lease.context.close()
+        except Exception as e:
+            print(f"Exception closing browser context: {e}")
+        await self.give_back(lease.pooled)
+
+    async def give_back(self, pooled: PooledBrowser) -> None:
+        async with self.condition:
+            pooled.leases -= 1
+            pooled.last_used = time.monotonic()
+            self.condition.notify_all()
+
+    async def reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                print(f"Exception reaping browsers: {e}")
+
+    async def reap(self) -> None:
+        """ Drop crashed browsers and close idle ones beyond the warm set """
+        now = time.monotonic()
+        async with self.condition:
+            unhealthy = [pooled for pooled in self.browsers if not pooled.healthy]
+            healthy = [pooled for pooled in self.browsers if pooled.healthy]
+            idle = [
+                pooled
+                for pooled in healthy
+                if pooled.leases == 0 and now - pooled.last_used > self.idle_timeout
+            ]
+            idle = idle[: max(0, len(healthy) - self.warm_browsers)]
+            for pooled in unhealthy + idle:
+                self.browsers.remove(pooled)
+            if unhealthy:
+                # Freed slots let waiting leases launch replacements
+                self.condition.notify_all()
+
+        for pooled in unhealthy + idle:
+            try:
+                await pooled.browser.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self.browsers),
+            "launching": self.launching,
+            "leases": sum(pooled.leases for pooled in self.browsers),
+        }
+
+    async def close(self) -> None:
+        if self.reaper:
+            self.reaper.cancel()
+            self.reaper = None
+        for pooled in self.browsers:
+            try:
+                await pooled.browser.close()
+            except Exception:
+                pass
+        self.browsers.clear()
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Get the process-wide browser pool"""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool(
+            max_browsers=settings.browser_pool_max_browsers,
+            max_contexts_per_browser=settings.browser_pool_max_contexts,
+            warm_browsers=settings.browser_pool_warm_browsers,
+            idle_timeout=settings.browser_pool_idle_timeout,
+        )
+    return _browser_pool
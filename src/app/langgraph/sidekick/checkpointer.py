@@ -0,0 +1,186 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+from typing import Any, Optional
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """In-memory checkpointer keeping the last N checkpoints per thread and at most max_threads threads (LRU)"""
+
+    def __init__(self, keep_last: int = 20, max_threads: int = 500):
+        super().__init__()
+        self.keep_last = max(1, keep_last)
+        self.max_threads = max_threads
+        self.threads: OrderedDict[str, None] = OrderedDict()
+        # Channel versions each retained checkpoint points at, and the blobs each (thread, namespace) owns,
+        # so pruning only drops blobs no retained checkpoint still needs
+        self.checkpoint_versions: dict[tuple[str, str, str], dict[str, Any]] = {}
+        self.thread_blobs: defaultdict[tuple[str, str], set] = defaultdict(set)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        self.checkpoint_versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+        self.thread_blobs[(thread_id, checkpoint_ns)].update(
+            (thread_id, checkpoint_ns, channel, version) for channel, version in new_versions.items()
+        )
+        self.touch(thread_id)
+        self.prune(thread_id, checkpoint_ns)
+        self.evict()
+        return result
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id in self.threads:
+            self.threads.move_to_end(thread_id)
+        return super().get_tuple(config)
+
+    def touch(self, thread_id: str) -> None:
+        self.threads[thread_id] = None
+        self.threads.move_to_end(thread_id)
+
+    def prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_last:
+            return
+        # Checkpoint ids are time ordered, so the lowest ones are the oldest
+        for checkpoint_id in sorted(checkpoints)[: -self.keep_last]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self.checkpoint_versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        live = {
+            (thread_id, checkpoint_ns, channel, version)
+            for checkpoint_id in checkpoints
+            for channel, version in self.checkpoint_versions.get((thread_id, checkpoint_ns, checkpoint_id), {}).items()
+        }
+        owned = self.thread_blobs[(thread_id, checkpoint_ns)]
+        for key in owned - live:
+            self.blobs.pop(key, None)
+        owned &= live
+
+    def evict(self) -> None:
+        while len(self.threads) > self.max_threads:
+            thread_id, _ = self.threads.popitem(last=False)
+            self.delete_thread(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self.threads.pop(thread_id, None)
+        for key in [key for key in self.checkpoint_versions if key[0] == thread_id]:
+            del self.checkpoint_versions[key]
+        for key in [key for key in self.thread_blobs if key[0] == thread_id]:
+            del self.thread_blobs[key]
+
+
+class SqliteCheckpointPruner:
+    """Background task deleting all but the last N checkpoints of every thread from an AsyncSqliteSaver database"""
+
+    def __init__(self, saver: AsyncSqliteSaver, keep_last: int = 20):
+        self.saver = saver
+        self.keep_last = max(1, keep_last)
+
+    async def prune(self) -> int:
+        async with self.saver.lock:
+            cursor = await self.saver.conn.execute(
+                """
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                        ) AS position
+                        FROM checkpoints
+                    ) WHERE position > ?
+                )
+                """,
+                (self.keep_last,),
+            )
+            deleted = cursor.rowcount
+            await self.saver.conn.execute(
+                """
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints
+                    WHERE checkpoints.thread_id = writes.thread_id
+                    AND checkpoints.checkpoint_ns = writes.checkpoint_ns
+                    AND checkpoints.checkpoint_id = writes.checkpoint_id
+                )
+                """
+            )
+            await self.saver.conn.commit()
+        return deleted
+
+    async def run_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                deleted = await self.prune()
+                if deleted:
+                    print(f"Pruned {deleted} old checkpoints")
+            except Exception as e:
+                print(f"Exception pruning checkpoints: {e}")
+
+
+async def open_sqlite_checkpointer(path: str, keep_last: int, prune_interval: float) -> AsyncSqliteSaver:
+    # One shared connection for every Sidekick: SQLite has a single writer anyway, and AsyncSqliteSaver serialises on it
+    conn = await aiosqlite.connect(path)
+    # WAL lets reads proceed alongside the writer, and NORMAL sync is still crash safe under WAL while skipping an fsync per commit
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute("PRAGMA busy_timeout=5000")
+    saver = AsyncSqliteSaver(conn)
+    await saver.setup()
+
+    global _pruner_task
+    _pruner_task = asyncio.create_task(SqliteCheckpointPruner(saver, keep_last).run_forever(prune_interval))
+    return saver
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_checkpointer_lock = asyncio.Lock()
+_pruner_task: Optional[asyncio.Task] = None
+
+
+async def get_checkpointer() -> BaseCheckpointSaver:
+    """Get the process-wide checkpointer shared by all Sidekicks, chosen by settings.sidekick_checkpointer"""
+    global _checkpointer
+    async with _checkpointer_lock:
+        if _checkpointer is None:
+            if settings.sidekick_checkpointer == "sqlite":
+                _checkpointer = await open_sqlite_checkpointer(
+                    settings.sidekick_checkpoint_db,
+                    keep_last=settings.sidekick_checkpoint_keep_last,
+                    prune_interval=settings.sidekick_checkpoint_prune_interval,
+                )
+            else:
+                _checkpointer = BoundedMemorySaver(
+                    keep_last=settings.sidekick_checkpoint_keep_last,
+                    max_threads=settings.sidekick_checkpoint_max_threads,
+                )
+    return _checkpointer
+
+
+async def close_checkpointer() -> None:
+    """Stop background pruning and close the SQLite connection, whose worker thread otherwise keeps the process alive"""
+    global _checkpointer, _pruner_task
+    if _pruner_task:
+        _pruner_task.cancel()
+        _pruner_task = None
+    if isinstance(_checkpointer, AsyncSqliteSaver):
+        await _checkpointer.conn.close()
+    _checkpointer = None
@@ -0,0 +1,327 @@
+import asyncio
+import statistics
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from src.app.langgraph.sidekick.browser_pool import get_browser_pool
+from src.app.langgraph.sidekick.checkpointer import close_checkpointer
+from src.app.langgraph.sidekick.python_sandbox import get_sandbox_pool
+from src.app.langgraph.sidekick.sidekick import Sidekick
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+# Owners remembered per live session, so a reaped or evicted session can still be rebuilt for its owner only
+OWNERS_PER_SESSION = 10
+
+
+class AdmissionError(Exception):
+    """Raised when a session or superstep can't be admitted: capacity, quota, a full queue or shutdown"""
+
+
+class FairLimiter:
+    """Concurrency limit whose waiters are admitted strictly in arrival order"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self.waiters if not waiter.done())
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Cancelled just after being handed a slot, so pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        # The slot moves straight to the next waiter, so nobody can barge in between
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+@dataclass
+class Session:
+    session_id: str
+    user: str
+    sidekick: Optional[Sidekick] = None
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    busy: bool = False
+    last_active: float = field(default_factory=time.monotonic)
+
+
+class SidekickManager:
+    """Owns every live Sidekick: admission control, a fair superstep queue, idle reaping and shutdown
+
+    Sessions are capped globally and per user. When a cap is hit the least recently used idle session
+    (of that user, for the per-user cap) is closed to make room; if every session is busy the new one is refused.
+    Supersteps beyond max_concurrent_supersteps wait in a FIFO queue of at most max_queued_supersteps.
+    A reaped session is transparently rebuilt under the same id on its next message, resuming from the checkpointer.
+    A session only ever serves the user who opened it; any other user's call with its id is refused.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 20,
+        max_sessions_per_user: int = 3,
+        max_concurrent_supersteps: int = 8,
+        max_queued_supersteps: int = 50,
+        idle_timeout: float = 1800.0,
+        reap_interval: float = 60.0,
+        sidekick_factory: Callable[[Optional[str]], Sidekick] = Sidekick,
+    ):
+        self.max_sessions = max_sessions
+        self.max_sessions_per_user = max_sessions_per_user
+        self.max_queued_supersteps = max_queued_supersteps
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.sidekick_factory = sidekick_factory
+        self.sessions: Dict[str, Session] = {}
+        # Who opened each session, kept past reaping and eviction (oldest forgotten first)
+        self.owners: OrderedDict[str, str] = OrderedDict()
+        self.limiter = FairLimiter(max_concurrent_supersteps)
+        self.lock = asyncio.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.reaper: Optional[asyncio.Task] = None
+        self.draining = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.running = 0
+        self.latencies: deque[float] = deque(maxlen=1000)
+        self.counters = {"supersteps": 0, "rejected": 0, "evicted": 0, "reaped": 0}
+
+    def start(self) -> None:
+        if self.reaper is None:
+            self.loop = asyncio.get_running_loop()
+            self.reaper = asyncio.create_task(self.reap_forever())
+
+    def lru_idle(self, sessions: List[Session]) -> Optional[Session]:
+        idle = [session for session in sessions if not session.busy and session.ready.is_set()]
+        return min(idle, key=lambda session: session.last_active, default=None)
+
+    async def make_room(self, user: str) -> None:
+        """Evict idle sessions until the new one fits both caps, or refuse it. Called with the lock held"""
+        while True:
+            own = [session for session in self.sessions.values() if session.user == user]
+            if len(own) >= self.max_sessions_per_user:
+                victim = self.lru_idle(own)
+                reason = f"You already have {len(own)} active sessions, the limit is {self.max_sessions_per_user}"
+            elif len(self.sessions) >= self.max_sessions:
+                victim = self.lru_idle(list(self.sessions.values()))
+                reason = "The Sidekick is at capacity, please try again shortly"
+            else:
+                return
+            if victim is None:
+                self.counters["rejected"] += 1
+                raise AdmissionError(reason)
+            self.counters["evicted"] += 1
+            await self.discard(victim)
+
+    async def open_session(self, user: str, session_id: Optional[str] = None) -> str:
+        """Create a Sidekick for user, reusing session_id so a rebuilt session resumes its conversation"""
+        if self.draining:
+            raise AdmissionError("The Sidekick is shutting down")
+        self.start()
+        async with self.lock:
+            if session_id is not None:
+                self.check_owner(user, session_id)
+            if session_id in self.sessions:
+                return session_id
+            await self.make_room(user)
+            # Reserve the slot before the slow setup, so concurrent opens can't overshoot the caps
+            sidekick = self.sidekick_factory(session_id)
+            session = Session(session_id=sidekick.sidekick_id, user=user)
+            self.sessions[session.session_id] = session
+            self.owners[session.session_id] = user
+            self.owners.move_to_end(session.session_id)
+            while len(self.owners) > OWNERS_PER_SESSION * self.max_sessions:
+                self.owners.popitem(last=False)
+
+        try:
+            await sidekick.setup()
+        except BaseException:
+            self.sessions.pop(session.session_id, None)
+            # Wakes anyone waiting on this session, who then sees it has no Sidekick
+            session.ready.set()
+            await sidekick.close()
+            raise
+        session.sidekick = sidekick
+        session.ready.set()
+        return session.session_id
+
+    def check_owner(self, user: str, session_id: str) -> None:
+        """Refuse a session id that another user opened, or one we no longer (or never did) know the owner of"""
+        if self.owners.get(session_id) != user:
+            self.counters["rejected"] += 1
+            raise AdmissionError("Unknown or expired session, please reload the page")
+
+    async def get_session(self, user: str, session_id: str) -> Session:
+        self.check_owner(user, session_id)
+        session = self.sessions.get(session_id)
+        if session is None:
+            # Reaped or evicted while idle: rebuild it
+            await self.open_session(user, session_id)
+            session = self.sessions[session_id]
+        await session.ready.wait()
+        if session.sidekick is None:
+            raise AdmissionError("The Sidekick failed to start, please try again")
+        return session
+
+    async def run_superstep(
+        self, user: str, session_id: str, message, success_criteria, history
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream a superstep of the session, waiting for a free slot in arrival order"""
+        if self.draining:
+            raise AdmissionError("The Sidekick is shutting down")
+        if self.limiter.queued >= self.max_queued_supersteps:
+            self.counters["rejected"] += 1
+            raise AdmissionError("The Sidekick is busy, please try again shortly")
+        session = await self.get_session(user, session_id)
+        # Marked busy while queued too, so it isn't reaped or evicted from under the waiting request
+        session.busy = True
+        self.running += 1
+        self.idle.clear()
+        try:
+            await self.limiter.acquire()
+            try:
+                start = time.perf_counter()
+                async for result in session.sidekick.stream_superstep(message, success_criteria, history):
+                    yield result
+                self.latencies.append(time.perf_counter() - start)
+                self.counters["supersteps"] += 1
+            finally:
+                self.limiter.release()
+        finally:
+            session.busy = False
+            session.last_active = time.monotonic()
+            self.running -= 1
+            if not self.running:
+                self.idle.set()
+
+    def cancel(self, session_id: str, user: Optional[str] = None) -> bool:
+        """Abort the session's running superstep; with user, only if that user owns the session"""
+        session = self.sessions.get(session_id)
+        if session is None or (user is not None and session.user != user):
+            return False
+        return bool(session.sidekick and session.sidekick.cancel())
+
+    async def discard(self, session: Session) -> None:
+        if self.sessions.get(session.session_id) is session:
+            del self.sessions[session.session_id]
+        if session.sidekick:
+            session.sidekick.cancel()
+            try:
+                await session.sidekick.close()
+            except Exception as e:
+                print(f"Exception closing Sidekick {session.session_id}: {e}")
+
+    async def close_session(self, session_id: str, user: Optional[str] = None) -> None:
+        """Close the session for good; with user, only if that user owns it"""
+        if user is not None and self.owners.get(session_id) != user:
+            return
+        self.owners.pop(session_id, None)
+        session = self.sessions.get(session_id)
+        if session:
+            await self.discard(session)
+
+    def close_session_threadsafe(self, session_id: str) -> None:
+        """For callers without the manager's loop, e.g. Gradio deleting a browser tab's state"""
+        if self.loop and not self.loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.close_session(session_id), self.loop)
+
+    async def reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                print(f"Exception reaping Sidekicks: {e}")
+
+    async def reap(self) -> None:
+        """Close sessions that have been idle for longer than idle_timeout"""
+        now = time.monotonic()
+        async with self.lock:
+            expired = [
+                session
+                for session in self.sessions.values()
+                if not session.busy and session.ready.is_set() and now - session.last_active > self.idle_timeout
+            ]
+            for session in expired:
+                await self.discard(session)
+        self.counters["reaped"] += len(expired)
+        if expired:
+            print(f"Reaped {len(expired)} idle Sidekicks")
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Refuse new work, let in-flight supersteps finish (cancelling them after timeout), then free everything"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Cancelling {self.running} supersteps still running after {timeout}s")
+            for session in list(self.sessions.values()):
+                if session.sidekick:
+                    session.sidekick.cancel()
+        if self.reaper:
+            self.reaper.cancel()
+            self.reaper = None
+        for session in list(self.sessions.values()):
+            await self.discard(session)
+        await close_checkpointer()
+        await get_browser_pool().close()
+        if get_sandbox_pool.cache_info().currsize:
+            get_sandbox_pool().close()
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Drain from another thread, e.g. the main thread once the UI server stops"""
+        if self.loop and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.drain(timeout), self.loop).result(timeout + 30)
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "active_sessions": len(self.sessions),
+            "users": len({session.user for session in self.sessions.values()}),
+            "running_supersteps": self.limiter.active,
+            "queued_supersteps": self.limiter.queued,
+            "superstep_p50": percentiles[49] if percentiles else None,
+            "superstep_p95": percentiles[94] if percentiles else None,
+            **self.counters,
+            "browser_pool": get_browser_pool().stats(),
+        }
+
+
+_manager: Optional[SidekickManager] = None
+
+
+def get_sidekick_manager() -> SidekickManager:
+    """Get the process-wide Sidekick manager"""
+    global _manager
+    if _manager is None:
+        _manager = SidekickManager(
+            max_sessions=settings.sidekick_max_sessions,
+            max_sessions_per_user=settings.sidekick_max_sessions_per_user,
+            max_concurrent_supersteps=settings.sidekick_max_concurrent_supersteps,
+            max_queued_supersteps=settings.sidekick_max_queued_supersteps,
+            idle_timeout=settings.sidekick_idle_timeout,
+            reap_interval=settings.sidekick_reap_interval,
+        )
+    return _manager
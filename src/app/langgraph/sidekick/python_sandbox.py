@@ -0,0 +1,219 @@
+import asyncio
+import json
+import queue
+import re
+import select
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.tools import Tool
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+WORKER_SCRIPT = Path(__file__).with_name("sandbox_worker.py")
+# (module, name it is bound to in every execution)
+PRELOAD_MODULES = (("numpy", "np"), ("pandas", "pd"))
+READY_TIMEOUT = 60.0
+# A worker that fails to start is retried after 1, 2, 4... seconds (at most 30), and given up on after 5 attempts
+START_BACKOFF_BASE = 1.0
+START_BACKOFF_MAX = 30.0
+MAX_START_ATTEMPTS = 5
+
+
+class SandboxTimeout(Exception):
+    pass
+
+
+def sanitize_input(code: str) -> str:
+    """Strip the markdown fences and leading "python" LLMs like to wrap code in, as PythonREPLTool does"""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+
+class SandboxWorker:
+    """One warm interpreter, started by path so it never re-imports the app, talking JSON lines over its pipes"""
+
+    def __init__(self, config: dict[str, Any]):
+        self.process = subprocess.Popen(
+            [sys.executable, str(WORKER_SCRIPT), json.dumps(config)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self.executions = 0
+
+    def receive(self, timeout: float) -> dict[str, Any]:
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise SandboxTimeout()
+        line = self.process.stdout.readline()
+        if not line:
+            raise EOFError("sandbox worker exited")
+        return json.loads(line)
+
+    def wait_ready(self, timeout: float) -> None:
+        self.receive(timeout)
+
+    def run(self, code: str, timeout: float) -> str:
+        self.process.stdin.write(json.dumps({"code": code}) + "\n")
+        self.process.stdin.flush()
+        self.executions += 1
+        return self.receive(timeout)["output"]
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class PythonSandboxPool:
+    """A pool of warm worker processes running LLM-written Python outside the server process
+
+    Each worker has numpy and pandas imported up front, an address-space limit and a per-execution CPU-time limit.
+    The pool adds a wall-clock timeout, killing and replacing workers that overrun or die, and recycles workers
+    after max_executions so leaked memory or monkey-patched modules don't build up.
+    Executions are stateless: every run starts from a fresh namespace.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_executions: int = 50,
+        timeout: float = 30.0,
+        cpu_seconds: int = 10,
+        memory_mb: int = 1024,
+        max_output: int = 10000,
+        acquire_timeout: float = 60.0,
+        preload: tuple[tuple[str, str], ...] = PRELOAD_MODULES,
+    ):
+        self.max_executions = max_executions
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.config = {
+            "preload": preload,
+            "cpu_seconds": cpu_seconds,
+            "memory_bytes": memory_mb * 1024 * 1024,
+            "max_output": max_output,
+        }
+        self.idle: queue.Queue[SandboxWorker] = queue.Queue()
+        self.metrics: Counter = Counter()
+        self.closed = False
+        # Start every worker before waiting on any, so their imports overlap
+        workers = [SandboxWorker(self.config) for _ in range(size)]
+        for worker in workers:
+            self.add_when_ready(worker)
+
+    def add_when_ready(self, worker: SandboxWorker, attempt: int = 1) -> None:
+        try:
+            worker.wait_ready(READY_TIMEOUT)
+        except Exception as e:
+            print(f"Exception starting sandbox worker (attempt {attempt}): {e!r}")
+            worker.stop()
+            self.metrics["start_failures"] += 1
+            if attempt >= MAX_START_ATTEMPTS:
+                # Most likely a broken interpreter or preload; the pool runs one worker short rather than spinning
+                print(f"Giving up on a sandbox worker after {attempt} failed starts")
+                return
+            delay = min(START_BACKOFF_MAX, START_BACKOFF_BASE * 2 ** (attempt - 1))
+            threading.Thread(target=self.start_later, args=(delay, attempt + 1), daemon=True).start()
+            return
+        if self.closed:
+            worker.stop()
+            return
+        self.idle.put(worker)
+
+    def start_later(self, delay: float, attempt: int) -> None:
+        time.sleep(delay)
+        if not self.closed:
+            self.add_when_ready(SandboxWorker(self.config), attempt)
+
+    def replace(self, worker: SandboxWorker) -> None:
+        """Stop a worker and warm up its replacement in the background, off the caller's path"""
+        worker.stop()
+        if not self.closed:
+            threading.Thread(target=self.add_when_ready, args=(SandboxWorker(self.config),), daemon=True).start()
+
+    def run(self, code: str) -> str:
+        code = sanitize_input(code)
+        try:
+            worker = self.idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            # Every worker is busy, or none could be started
+            self.metrics["unavailable"] += 1
+            return f"Error: no Python worker became available within {self.acquire_timeout} seconds"
+        self.metrics["executions"] += 1
+        try:
+            output = worker.run(code, self.timeout)
+        except SandboxTimeout:
+            self.metrics["timeouts"] += 1
+            self.replace(worker)
+            return f"Error: execution timed out after {self.timeout} seconds"
+        except (EOFError, OSError, ValueError):
+            # The worker was killed, most likely by its hard CPU limit or by running out of memory mid-allocation
+            self.metrics["crashes"] += 1
+            self.replace(worker)
+            return "Error: the Python process crashed, probably by exceeding its CPU or memory limit"
+
+        if worker.executions >= self.max_executions:
+            self.metrics["recycled"] += 1
+            self.replace(worker)
+        else:
+            self.idle.put(worker)
+        return output
+
+    async def arun(self, code: str) -> str:
+        # The worker does the computation, this thread only waits on its pipe
+        return await asyncio.to_thread(self.run, code)
+
+    def stats(self) -> dict[str, int]:
+        return {**self.metrics, "idle_workers": self.idle.qsize()}
+
+    def close(self) -> None:
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+@lru_cache()
+def get_sandbox_pool() -> PythonSandboxPool:
+    """Get the process-wide Python sandbox pool, warming up its workers on first use"""
+    return PythonSandboxPool(
+        size=settings.python_sandbox_workers,
+        max_executions=settings.python_sandbox_max_executions,
+        timeout=settings.python_sandbox_timeout,
+        cpu_seconds=settings.python_sandbox_cpu_seconds,
+        memory_mb=settings.python_sandbox_memory_mb,
+        max_output=settings.python_sandbox_max_output,
+        acquire_timeout=settings.python_sandbox_acquire_timeout,
+    )
+
+
+def python_sandbox_tool(pool: Optional[PythonSandboxPool] = None) -> Tool:
+    """A drop-in replacement for PythonREPLTool that runs code in the sandbox pool"""
+    pool = pool or get_sandbox_pool()
+    return Tool(
+        name="Python_REPL",
+        description=(
+            "A Python shell. Use this to execute python commands. Input should be a valid python command. "
+            "If you want to see the output of a value, you should print it out with `print(...)`. "
+            "Each call starts with fresh variables, so include everything the code needs; "
+            "numpy (np) and pandas (pd) are already imported."
+        ),
+        func=pool.run,
+        coroutine=pool.arun,
+    )
@@ -0,0 +1,101 @@
+"""Child process of the Python sandbox pool: runs code sent by the parent under CPU, memory and output limits.
+
+It only uses the standard library and is started by path, so it never imports the app (or its __main__) again.
+Protocol: one JSON object per line, requests on stdin and replies on the original stdout.
+"""
+
+import importlib
+import io
+import json
+import os
+import resource
+import signal
+import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+class CappedOutput(io.StringIO):
+    """Captured stdout that stops growing once it reaches the limit"""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+        self.truncated = False
+
+    def write(self, text: str) -> int:
+        room = self.limit - self.tell()
+        if room <= 0:
+            self.truncated = True
+            return len(text)
+        if len(text) > room:
+            self.truncated = True
+        super().write(text[:room])
+        return len(text)
+
+
+def raise_cpu_limit(signum, frame):
+    raise CpuLimitExceeded("CPU time limit exceeded")
+
+
+def cpu_time_used() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    config = json.loads(sys.argv[1])
+
+    # Keep the real stdout for the protocol and point fd 1 at /dev/null, so stray writes from user code can't corrupt it
+    protocol = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    # Imported once per worker, which is the whole point of keeping the pool warm
+    preloaded = {}
+    for name, alias in config["preload"]:
+        try:
+            preloaded[alias] = importlib.import_module(name)
+        except ImportError:
+            pass
+
+    if config["memory_bytes"]:
+        resource.setrlimit(resource.RLIMIT_AS, (config["memory_bytes"], config["memory_bytes"]))
+    signal.signal(signal.SIGXCPU, raise_cpu_limit)
+
+    protocol.write(json.dumps({"ready": True}) + "\n")
+    protocol.flush()
+
+    for line in sys.stdin:
+        code = json.loads(line)["code"]
+        # RLIMIT_CPU counts the whole process lifetime, so grant this run cpu_seconds on top of what was used so far.
+        # Only the soft limit moves (a lowered hard limit could never be raised again); code stuck in C past
+        # SIGXCPU is left to the parent's wall-clock timeout
+        soft = int(cpu_time_used()) + config["cpu_seconds"]
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+
+        output = CappedOutput(config["max_output"])
+        stdin = sys.stdin
+        try:
+            sys.stdin = io.StringIO("")
+            with redirect_stdout(output), redirect_stderr(output):
+                exec(code, dict(preloaded))
+        except BaseException as e:
+            # Skip our own exec frame, the model only needs the frames of its code
+            output.write("".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)))
+        finally:
+            sys.stdin = stdin
+
+        text = output.getvalue()
+        if output.truncated:
+            text += f"\n[output truncated to {config['max_output']} characters]"
+        protocol.write(json.dumps({"output": text}) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
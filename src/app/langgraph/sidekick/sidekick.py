@@ -2,21 +2,33 @@ from typing import Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from typing import List, Any, Optional, Dict
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage, trim_messages
+from langchain_core.messages.utils import count_tokens_approximately
+from typing import List, Any, Optional, Dict, AsyncIterator
 from pydantic import BaseModel, Field
 import uuid
 import asyncio
 from datetime import datetime
 
+from src.app.langgraph.sidekick.checkpointer import get_checkpointer
+from src.app.langgraph.sidekick.tool_executor import ParallelToolNode
 from src.app.langgraph.sidekick.tools import playwright_tools, other_tools
 from src.app.settings import get_settings
 
 settings = get_settings()
 
+# Prompt sizes kept in state, and the stored evaluator transcript's budget (a multiple of what one evaluation sees),
+# so neither grows with every iteration of a long-lived thread
+MAX_PROMPT_USAGE_RECORDS = 100
+TRANSCRIPT_STORE_FACTOR = 2
+OMITTED = "[... earlier messages omitted ...]\n"
+TRUNCATED = "\n[... truncated to fit the context ...]"
+
+
+def recent_prompt_usage(existing: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return (existing + new)[-MAX_PROMPT_USAGE_RECORDS:]
+
 
 class State(TypedDict):
     messages: Annotated[List[Any], add_messages]
@@ -24,6 +36,11 @@ class State(TypedDict):
     feedback_on_work: Optional[str]
     success_criteria_met: bool
     user_input_needed: bool
+    # Evaluator transcript, extended with only the messages added since the last evaluation
+    transcript: str
+    transcript_length: int
+    # Approximate prompt tokens of the recent worker / evaluator calls, to watch growth across iterations
+    prompt_tokens: Annotated[List[Dict[str, Any]], recent_prompt_usage]
 
 class EvaluatorOutput(BaseModel):
     feedback: str = Field(description="Feedback on the assistant's response")
@@ -34,19 +51,24 @@ class EvaluatorOutput(BaseModel):
 
 
 class Sidekick:
-    def __init__(self):
+    def __init__(self, sidekick_id: Optional[str] = None):
         self.worker_llm_with_tools = None
         self.evaluator_llm_with_output = None
         self.tools = None
+        self.browser_tool_names = set()
         self.llm_with_tools = None
         self.graph = None
-        self.sidekick_id = str(uuid.uuid4())
-        self.memory = MemorySaver()
-        self.browser = None
-        self.playwright = None
+        # Passing a previous id resumes that conversation when the checkpointer is persistent
+        self.sidekick_id = sidekick_id or str(uuid.uuid4())
+        self.memory = None
+        self.browser_lease = None
+        # Task driving the graph for the superstep currently being streamed, used as the cancellation handle
+        self.superstep_task: Optional[asyncio.Task] = None
 
     async def setup(self):
-        self.tools, self.browser, self.playwright = await playwright_tools()
+        self.memory = await get_checkpointer()
+        self.tools, self.browser_lease = await playwright_tools()
+        self.browser_tool_names = {tool.name for tool in self.tools}
         self.tools += await other_tools()
         
         worker_llm = ChatOpenAI(model=settings.openai_model)
@@ -57,7 +79,7 @@ class Sidekick:
         
         await self.build_graph()
 
-    def worker(self, state: State) -> Dict[str, Any]:
+    def worker_messages(self, state: State) -> List[Any]:
         system_message = f"""You are a helpful assistant that can use tools to complete tasks.
     You keep working on a task until either you have a question or clarification for the user, or the success criteria is met.
     You have many tools to help you, including tools to browse the internet, navigating and retrieving web pages.
@@ -93,12 +115,75 @@ class Sidekick:
         if not found_system_message:
             messages = [SystemMessage(content=system_message)] + messages
 
-        # Invoke the LLM with tools
-        response = self.worker_llm_with_tools.invoke(messages)
+        return self.trim_worker_messages(messages, settings.sidekick_worker_max_tokens)
+
+    def trim_worker_messages(self, messages: List[Any], max_tokens: int) -> List[Any]:
+        """ Fit the worker prompt to a token budget, always keeping the system prompt and the latest user request """
+        human_indexes = [index for index, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        if not human_indexes:
+            return messages
+        request_index = human_indexes[-1]
+        head = [message for message in messages[:request_index] if isinstance(message, SystemMessage)]
+        budget = max_tokens - count_tokens_approximately(head + [messages[request_index]])
+
+        current = messages[request_index + 1:]
+        # The newest step always stays, cut down if it alone is over budget: the last message, or when that is a
+        # tool result, the tool call with all of its results
+        start = len(current) - 1
+        while start > 0 and isinstance(current[start], ToolMessage):
+            start -= 1
+        newest = self.truncate_messages(current[start:], budget) if current else []
+        budget -= count_tokens_approximately(newest)
+
+        # Earlier work on the current request next, newest to oldest
+        kept = []
+        for message in reversed(current[:start]):
+            cost = count_tokens_approximately([message])
+            if cost > budget:
+                break
+            budget -= cost
+            kept.insert(0, message)
+        # Tool results whose tool call was trimmed away would be rejected by the model
+        while kept and isinstance(kept[0], ToolMessage):
+            kept.pop(0)
+        kept += newest
+
+        earlier = []
+        if len(kept) == len(current):
+            # Spare budget goes to earlier turns, never starting on a tool result that lost its tool call
+            earlier = trim_messages(
+                [message for message in messages[:request_index] if not isinstance(message, SystemMessage)],
+                max_tokens=budget,
+                strategy="last",
+                token_counter=count_tokens_approximately,
+                start_on=("human", "ai"),
+            )
+        return head + earlier + [messages[request_index]] + kept
+
+    def truncate_messages(self, messages: List[Any], budget: int) -> List[Any]:
+        """ Shorten the tool results (or else the last message) so the messages fit the budget """
+        excess = count_tokens_approximately(messages) - budget
+        if excess <= 0:
+            return messages
+        targets = [index for index, message in enumerate(messages) if isinstance(message, ToolMessage)]
+        targets = targets or [len(messages) - 1]
+        messages = list(messages)
+        for index in targets:
+            content = str(messages[index].content)
+            # Roughly 4 characters a token, as count_tokens_approximately counts them
+            keep = max(0, len(content) - 4 * excess // len(targets) - len(TRUNCATED))
+            messages[index] = messages[index].model_copy(update={"content": content[:keep] + TRUNCATED})
+        return messages
+
+    async def worker(self, state: State) -> Dict[str, Any]:
+        # Invoke the LLM with tools through its async API, so the event loop is free while we wait on the model
+        messages = self.worker_messages(state)
+        response = await self.worker_llm_with_tools.ainvoke(messages)
 
         # Return updated state
         return {
             "messages": [response],
+            "prompt_tokens": [self.prompt_usage("worker", messages)],
         }
 
     def worker_router(self, state: State) -> str:
@@ -109,17 +194,76 @@ class Sidekick:
         else:
             return "evaluator"
 
+    def format_message(self, message: Any) -> str:
+        if isinstance(message, HumanMessage):
+            return f"User: {message.content}\n"
+        if isinstance(message, AIMessage):
+            text = message.content or "[Tools use]"
+            return f"Assistant: {text}\n"
+        return ""
+
     def format_conversation(self, messages: List[Any]) -> str:
-        conversation = "Conversation history:\n\n"
-        for message in messages:
-            if isinstance(message, HumanMessage):
-                conversation += f"User: {message.content}\n"
-            elif isinstance(message, AIMessage):
-                text = message.content or "[Tools use]"
-                conversation += f"Assistant: {text}\n"
-        return conversation
-
-    def evaluator(self, state: State) -> State:
+        return "Conversation history:\n\n" + "".join(self.format_message(message) for message in messages)
+
+    def update_transcript(self, state: State) -> Dict[str, Any]:
+        """ Append only the messages that arrived since the last evaluation to the cached transcript """
+        messages = state["messages"]
+        start = state.get("transcript_length") or 0
+        transcript = state.get("transcript") or "Conversation history:\n\n"
+        transcript += "".join(self.format_message(message) for message in messages[start:])
+        # Stored already trimmed, with room to spare over what one evaluation sees
+        transcript = self.trim_transcript(transcript, TRANSCRIPT_STORE_FACTOR * settings.sidekick_evaluator_max_tokens)
+        return {"transcript": transcript, "transcript_length": len(messages)}
+
+    def trim_transcript(self, transcript: str, max_tokens: int) -> str:
+        """ Fit the transcript to a token budget, always keeping the header and the latest user request: the rest of
+        the current turn goes first, then earlier turns, newest to oldest """
+        lines = transcript.splitlines(keepends=True)
+        # The header and a blank line, then the messages, each running on to the next "User: " / "Assistant: " line
+        header_end = min(2, len(lines))
+        starts = [index for index in range(header_end, len(lines)) if lines[index].startswith("User: ")]
+        request_start = starts[-1] if starts else header_end
+        request_end = request_start + 1 if starts else header_end
+        while request_end < len(lines) and not lines[request_end].startswith(("User: ", "Assistant: ", OMITTED)):
+            request_end += 1
+        head, request = lines[:header_end], lines[request_start:request_end]
+        budget = max_tokens - count_tokens_approximately([HumanMessage(content="".join(head + request))])
+
+        def newest_within_budget(candidates: List[str]) -> List[str]:
+            nonlocal budget
+            kept = []
+            for line in reversed(candidates):
+                cost = count_tokens_approximately([HumanMessage(content=line)])
+                if cost > budget:
+                    break
+                budget -= cost
+                kept.insert(0, line)
+            # Never start on the middle of a message that lost its first line
+            while len(kept) < len(candidates) and kept and not kept[0].startswith(("User: ", "Assistant: ")):
+                kept.pop(0)
+            return kept
+
+        # A transcript stored trimmed already has omission markers; they are added back below where still needed
+        current = [line for line in lines[request_end:] if line != OMITTED]
+        earlier = [line for line in lines[header_end:request_start] if line != OMITTED]
+        kept_current = newest_within_budget(current)
+        # Spare budget goes to earlier turns only once the current turn is there in full
+        kept_earlier = newest_within_budget(earlier) if len(kept_current) == len(current) else []
+        omitted_earlier = len(kept_earlier) < len(earlier) or OMITTED in lines[header_end:request_start]
+        omitted_current = len(kept_current) < len(current) or OMITTED in lines[request_end:]
+        return "".join(
+            head
+            + ([OMITTED] if omitted_earlier else [])
+            + kept_earlier
+            + request
+            + ([OMITTED] if omitted_current else [])
+            + kept_current
+        )
+
+    def prompt_usage(self, node: str, messages: List[Any]) -> Dict[str, Any]:
+        return {"node": node, "tokens": count_tokens_approximately(messages)}
+
+    def evaluator_messages(self, state: State, transcript: str) -> List[Any]:
         last_response = state["messages"][-1].content
 
         system_message = """You are an evaluator that determines if a task has been completed successfully by an Assistant.
@@ -129,7 +273,7 @@ class Sidekick:
         user_message = f"""You are evaluating a conversation between the User and Assistant. You decide what action to take based on the last response from the Assistant.
 
     The entire conversation with the assistant, with the user's original request and all replies, is:
-    {self.format_conversation(state["messages"])}
+    {self.trim_transcript(transcript, settings.sidekick_evaluator_max_tokens)}
 
     The success criteria for this assignment is:
     {state["success_criteria"]}
@@ -149,13 +293,13 @@ class Sidekick:
             user_message += f"Also, note that in a prior attempt from the Assistant, you provided this feedback: {state['feedback_on_work']}\n"
             user_message += "If you're seeing the Assistant repeating the same mistakes, then consider responding that user input is required."
 
-        evaluator_messages = [
+        return [
             SystemMessage(content=system_message),
             HumanMessage(content=user_message),
         ]
 
-        eval_result = self.evaluator_llm_with_output.invoke(evaluator_messages)
-        new_state = {
+    def evaluation_update(self, eval_result: EvaluatorOutput) -> Dict[str, Any]:
+        return {
             "messages": [
                 {
                     "role": "assistant",
@@ -166,7 +310,18 @@ class Sidekick:
             "success_criteria_met": eval_result.success_criteria_met,
             "user_input_needed": eval_result.user_input_needed,
         }
-        return new_state
+
+    def prepare_evaluation(self, state: State) -> tuple[List[Any], Dict[str, Any]]:
+        """ Build the evaluator prompt, plus the transcript and token bookkeeping to write back to state """
+        update = self.update_transcript(state)
+        messages = self.evaluator_messages(state, update["transcript"])
+        update["prompt_tokens"] = [self.prompt_usage("evaluator", messages)]
+        return messages, update
+
+    async def evaluator(self, state: State) -> Dict[str, Any]:
+        messages, update = self.prepare_evaluation(state)
+        eval_result = await self.evaluator_llm_with_output.ainvoke(messages)
+        return {**update, **self.evaluation_update(eval_result)}
 
     def route_based_on_evaluation(self, state: State) -> str:
         if state["success_criteria_met"] or state["user_input_needed"]:
@@ -180,7 +335,17 @@ class Sidekick:
 
         # Add nodes
         graph_builder.add_node("worker", self.worker)
-        graph_builder.add_node("tools", ToolNode(tools=self.tools))
+        # Browser tools all drive the one page of our leased context, so they share a concurrency limit
+        tool_node = ParallelToolNode(
+            tools=self.tools,
+            concurrency_limits={
+                "browser": settings.sidekick_browser_concurrency,
+                "Python_REPL": settings.python_sandbox_workers,
+            },
+            tool_groups={name: "browser" for name in self.browser_tool_names},
+            timeout=settings.sidekick_tool_timeout,
+        )
+        graph_builder.add_node("tools", tool_node)
         graph_builder.add_node("evaluator", self.evaluator)
 
         # Add edges
@@ -196,31 +361,113 @@ class Sidekick:
         # Compile the graph
         self.graph = graph_builder.compile(checkpointer=self.memory)
 
-    async def run_superstep(self, message, success_criteria, history):
-        config = {"configurable": {"thread_id": self.sidekick_id}}
-
-        state = {
+    def initial_state(self, message, success_criteria) -> State:
+        return {
             "messages": message,
             "success_criteria": success_criteria or "The answer should be clear and accurate",
             "feedback_on_work": None,
             "success_criteria_met": False,
             "user_input_needed": False,
         }
+
+    async def run_superstep(self, message, success_criteria, history):
+        config = {"configurable": {"thread_id": self.sidekick_id}}
+
+        state = self.initial_state(message, success_criteria)
         result = await self.graph.ainvoke(state, config=config)
         user = {"role": "user", "content": message}
         reply = {"role": "assistant", "content": result["messages"][-2].content}
         feedback = {"role": "assistant", "content": result["messages"][-1].content}
         return history + [user, reply, feedback]
 
+    async def stream_superstep(self, message, success_criteria, history) -> AsyncIterator[List[Dict[str, Any]]]:
+        """ Run a superstep, yielding the updated chat history as worker tokens, tool calls and evaluator verdicts arrive """
+        config = {"configurable": {"thread_id": self.sidekick_id}}
+        state = self.initial_state(message, success_criteria)
+
+        # The graph runs in its own task and feeds a queue, so cancel() can abort it even while it is
+        # blocked inside an LLM or tool call rather than only between yielded chunks
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            async for chunk in self.graph.astream(state, config=config, stream_mode=["messages", "updates"]):
+                queue.put_nowait(chunk)
+
+        history = history + [{"role": "user", "content": message}]
+        yield history
+
+        task = self.superstep_task = asyncio.create_task(pump())
+        # A done callback rather than a finally block, so the sentinel arrives even if the task is cancelled before it starts
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        reply = None
+        try:
+            while (chunk := await queue.get()) is not None:
+                mode, payload = chunk
+                if mode == "messages":
+                    token, metadata = payload
+                    # Only the worker's tokens are user facing, the evaluator streams raw structured output
+                    if metadata.get("langgraph_node") != "worker" or not isinstance(token, AIMessageChunk):
+                        continue
+                    if not token.content:
+                        continue
+                    if reply is None:
+                        reply = {"role": "assistant", "content": ""}
+                        history.append(reply)
+                    reply["content"] += token.content
+                    yield history
+                    continue
+
+                for node, update in payload.items():
+                    if node == "worker":
+                        last = update["messages"][-1]
+                        # A model that does not stream sends no tokens, so the bubble is filled from its final message
+                        if reply is None and isinstance(last.content, str) and last.content:
+                            history.append({"role": "assistant", "content": last.content})
+                        # The next worker turn starts a new chat bubble
+                        reply = None
+                        for tool_call in getattr(last, "tool_calls", None) or []:
+                            history.append(
+                                {"role": "assistant", "content": f"Using tool {tool_call['name']}: {tool_call['args']}"}
+                            )
+                    elif node == "evaluator":
+                        history.append({"role": "assistant", "content": update["messages"][-1]["content"]})
+                    yield history
+        finally:
+            if not task.done():
+                task.cancel()
+            self.superstep_task = None
+
+        if task.cancelled():
+            history.append({"role": "assistant", "content": "Superstep cancelled"})
+            yield history
+        else:
+            # Surface errors raised inside the graph
+            task.result()
+
+    async def prompt_token_usage(self) -> List[Dict[str, Any]]:
+        """ Approximate prompt tokens of each worker / evaluator call made on this thread so far """
+        snapshot = await self.graph.aget_state({"configurable": {"thread_id": self.sidekick_id}})
+        return snapshot.values.get("prompt_tokens", [])
+
+    def cancel(self) -> bool:
+        """ Abort the superstep currently being streamed, returns True if one was running """
+        if self.superstep_task and not self.superstep_task.done():
+            self.superstep_task.cancel()
+            return True
+        return False
+
+    async def close(self):
+        """ Release the leased browser context back to the shared pool """
+        if self.browser_lease:
+            lease, self.browser_lease = self.browser_lease, None
+            await lease.release()
+
     def cleanup(self):
-        if self.browser:
-            try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(self.browser.close())
-                if self.playwright:
-                    loop.create_task(self.playwright.stop())
-            except RuntimeError:
-                # If no loop is running, do a direct run
-                asyncio.run(self.browser.close())
-                if self.playwright:
-                    asyncio.run(self.playwright.stop())
\ No newline at end of file
+        if not self.browser_lease:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            loop.create_task(self.close())
+        except RuntimeError:
+            # Called from a thread without a loop (e.g. Gradio state deletion), so hand the release to the pool's loop
+            asyncio.run_coroutine_threadsafe(self.close(), self.browser_lease.pool.loop)
@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool, Tool
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+
+def normalise(value: Any) -> Any:
+    """ Normalise free-text tool arguments so trivially different calls ("  Paris " vs "paris") share a cache entry """
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().lower()
+    if isinstance(value, dict):
+        return {key: normalise(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalise(item) for item in value]
+    return value
+
+
+def make_key(tool_name: str, args: Any, fold_text: bool = False) -> str:
+    # Only tools that take free text (e.g. search queries) opt in to fold_text; paths, code and URLs stay exact
+    payload = json.dumps([tool_name, normalise(args) if fold_text else args], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class Flight:
+    """A call in progress that identical concurrent sync calls wait on instead of repeating"""
+
+    event: threading.Event = field(default_factory=threading.Event)
+    value: Any = None
+    error: Optional[BaseException] = None
+
+
+class ToolCache:
+    """Tool results in an in-memory LRU in front of an on-disk SQLite store, with per-entry TTLs"""
+
+    def __init__(self, path: str = "tool_cache.sqlite", max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache (key TEXT PRIMARY KEY, tool TEXT, value TEXT, expires_at REAL)"
+        )
+        self.conn.commit()
+        self.writes = 0
+        self.sync_flights: dict[str, Flight] = {}
+        self.async_flights: dict[str, asyncio.Future] = {}
+        self.metrics: defaultdict[str, Counter] = defaultdict(Counter)
+
+    def memory_get(self, key: str) -> tuple[bool, Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def memory_put(self, key: str, value: Any, expires_at: float) -> None:
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def disk_get(self, key: str) -> tuple[bool, Any]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return False, None
+        value, expires_at = json.loads(row[0]), row[1]
+        self.memory_put(key, value, expires_at)
+        return True, value
+
+    def disk_put(self, tool_name: str, key: str, value: Any, expires_at: float) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, tool, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, tool_name, json.dumps(value, default=str), expires_at),
+            )
+            self.writes += 1
+            # Sweep expired rows now and then so the file does not grow forever
+            if self.writes % 100 == 0:
+                self.conn.execute("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+            self.conn.commit()
+
+    def lookup(self, tool_name: str, key: str) -> tuple[bool, Any]:
+        found, value = self.memory_get(key)
+        if found:
+            self.metrics[tool_name]["memory_hits"] += 1
+            return True, value
+        found, value = self.disk_get(key)
+        if found:
+            self.metrics[tool_name]["disk_hits"] += 1
+        return found, value
+
+    def store(self, tool_name: str, key: str, value: Any, ttl: float) -> None:
+        expires_at = time.time() + ttl
+        self.memory_put(key, value, expires_at)
+        self.disk_put(tool_name, key, value, expires_at)
+
+    def get_or_call(
+        self, tool_name: str, args: Any, ttl: float, call: Callable[[], Any], fold_text: bool = False
+    ) -> Any:
+        key = make_key(tool_name, args, fold_text)
+        found, value = self.lookup(tool_name, key)
+        if found:
+            return value
+
+        with self.lock:
+            flight = self.sync_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.sync_flights[key] = Flight()
+        if not leader:
+            self.metrics[tool_name]["deduplicated"] += 1
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        self.metrics[tool_name]["misses"] += 1
+        try:
+            flight.value = call()
+            self.store(tool_name, key, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                self.sync_flights.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_call(
+        self, tool_name: str, args: Any, ttl: float, call: Callable[[], Awaitable[Any]], fold_text: bool = False
+    ) -> Any:
+        key = make_key(tool_name, args, fold_text)
+        found, value = self.memory_get(key)
+        if found:
+            self.metrics[tool_name]["memory_hits"] += 1
+            return value
+        found, value = await asyncio.to_thread(self.disk_get, key)
+        if found:
+            self.metrics[tool_name]["disk_hits"] += 1
+            return value
+
+        future = self.async_flights.get(key)
+        if future is not None:
+            self.metrics[tool_name]["deduplicated"] += 1
+            # Shielded so a cancelled follower does not cancel the call everyone else is waiting on
+            return await asyncio.shield(future)
+
+        future = self.async_flights[key] = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved, so a call nobody else was waiting on does not log "exception never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.metrics[tool_name]["misses"] += 1
+        try:
+            value = await call()
+            await asyncio.to_thread(self.store, tool_name, key, value, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.async_flights.pop(key, None)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        report = {}
+        for tool_name, counts in self.metrics.items():
+            hits = counts["memory_hits"] + counts["disk_hits"] + counts["deduplicated"]
+            total = hits + counts["misses"]
+            report[tool_name] = {**counts, "hit_rate": hits / total if total else 0.0}
+        return report
+
+
+@lru_cache()
+def get_tool_cache() -> ToolCache:
+    """Get the process-wide tool cache"""
+    return ToolCache(path=settings.tool_cache_path, max_entries=settings.tool_cache_max_entries)
+
+
+def cached_tool(
+    tool: BaseTool, ttl: float, cache: Optional[ToolCache] = None, fold_text: bool = False
+) -> BaseTool:
+    """Wrap a LangChain tool so identical calls within ttl seconds are answered from the cache
+
+    With fold_text, string arguments differing only in case and whitespace count as identical, which suits free-text
+    queries but not paths, code or URLs.
+    """
+    cache = cache or get_tool_cache()
+
+    if isinstance(tool, Tool):
+        # Single string input tools, e.g. the Serper search
+        def run(tool_input: str) -> Any:
+            return cache.get_or_call(tool.name, tool_input, ttl, lambda: tool.invoke(tool_input), fold_text)
+
+        async def arun(tool_input: str) -> Any:
+            return await cache.aget_or_call(tool.name, tool_input, ttl, lambda: tool.ainvoke(tool_input), fold_text)
+
+        return Tool(name=tool.name, description=tool.description, func=run, coroutine=arun)
+
+    def run_structured(**kwargs) -> Any:
+        return cache.get_or_call(tool.name, kwargs, ttl, lambda: tool.invoke(kwargs), fold_text)
+
+    async def arun_structured(**kwargs) -> Any:
+        return await cache.aget_or_call(tool.name, kwargs, ttl, lambda: tool.ainvoke(kwargs), fold_text)
+
+    return StructuredTool.from_function(
+        func=run_structured,
+        coroutine=arun_structured,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        infer_schema=False,
+    )
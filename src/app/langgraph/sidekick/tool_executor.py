@@ -0,0 +1,102 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Awaitable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+
+@lru_cache()
+def get_tool_thread_pool() -> ThreadPoolExecutor:
+    """Get the bounded thread pool shared by every Sidekick for running synchronous tools"""
+    return ThreadPoolExecutor(max_workers=settings.sidekick_tool_threads, thread_name_prefix="sidekick-tool")
+
+
+def is_native_async(tool: BaseTool) -> bool:
+    # Tool / StructuredTool carry an optional coroutine, other tools are async when they override _arun
+    if hasattr(tool, "coroutine"):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+def release_threadsafe(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore) -> None:
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        # The loop is closed, and the semaphore with it
+        pass
+
+
+class ParallelToolNode:
+    """Graph node running every tool call of the last AI message concurrently, with results in call order
+
+    concurrency_limits caps how many calls of a tool (or of a group, see tool_groups) run at once,
+    e.g. a single Python REPL, or a few browser actions per leased context.
+    """
+
+    def __init__(
+        self,
+        tools: List[BaseTool],
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        tool_groups: Optional[Dict[str, str]] = None,
+        timeout: float = 60.0,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.tool_groups = tool_groups or {}
+        self.semaphores = {name: asyncio.Semaphore(limit) for name, limit in (concurrency_limits or {}).items()}
+        self.timeout = timeout
+
+    def error_message(self, tool_call: Dict[str, Any], content: str) -> ToolMessage:
+        return ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"], status="error")
+
+    async def run_tool_call(self, tool_call: Dict[str, Any], config: RunnableConfig) -> ToolMessage:
+        tool = self.tools.get(tool_call["name"])
+        if tool is None:
+            return self.error_message(
+                tool_call, f"Error: {tool_call['name']} is not a valid tool, try one of [{', '.join(self.tools)}]."
+            )
+
+        group = self.tool_groups.get(tool.name, tool.name)
+        semaphore = self.semaphores.get(group)
+        if semaphore is not None:
+            await semaphore.acquire()
+        if is_native_async(tool):
+            try:
+                return await self.wait_for_result(tool, tool_call, tool.ainvoke(tool_call, config))
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = get_tool_thread_pool().submit(partial(tool.invoke, tool_call, config))
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+        if semaphore is not None:
+            # A timed out sync tool keeps its thread until it returns, so it keeps its slot until then too;
+            # otherwise timed out calls piling up could exceed the group's limit
+            future.add_done_callback(lambda _: release_threadsafe(loop, semaphore))
+        return await self.wait_for_result(tool, tool_call, asyncio.wrap_future(future))
+
+    async def wait_for_result(self, tool: BaseTool, tool_call: Dict[str, Any], call: Awaitable) -> ToolMessage:
+        try:
+            # On a timeout the graph stops waiting on the call
+            return await asyncio.wait_for(call, self.timeout)
+        except asyncio.TimeoutError:
+            return self.error_message(tool_call, f"Error: {tool.name} timed out after {self.timeout} seconds.")
+        except Exception as e:
+            return self.error_message(tool_call, f"Error: {e!r}\n Please fix your mistakes.")
+
+    async def __call__(self, state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        message = state["messages"][-1]
+        tool_calls = message.tool_calls if isinstance(message, AIMessage) else []
+        results = await asyncio.gather(*[self.run_tool_call(tool_call, config) for tool_call in tool_calls])
+        return {"messages": list(results)}
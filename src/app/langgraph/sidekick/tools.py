@@ -1,4 +1,5 @@
-import requests
+import asyncio
+
 from langchain_community.agent_toolkits import (
     FileManagementToolkit,  # Gives the LLM tools to read, write, and manage files
     PlayWrightBrowserToolkit,  # Wraps Playwright browser actions as LLM-callable tools
@@ -15,13 +16,11 @@ from langchain_community.utilities.wikipedia import (
 from langchain_core.tools import (
     Tool,  # Base class for creating custom LangChain tools from plain Python functions
 )
-from langchain_experimental.tools import (
-    PythonREPLTool,  # A tool that lets the LLM write and execute arbitrary Python code
-)
-from playwright.async_api import (
-    async_playwright,  # Imports the async Playwright API for controlling a real browser
-)
 
+from src.app.langgraph.sidekick.browser_pool import BrowserLease, get_browser_pool
+from src.app.langgraph.sidekick.python_sandbox import get_sandbox_pool, python_sandbox_tool
+from src.app.langgraph.sidekick.tool_cache import cached_tool
+from src.app.notifications import notify
 from src.app.settings import get_settings
 
 settings = get_settings()
@@ -31,30 +30,21 @@ serper = (
 ) 
 
 
-async def playwright_tools():
-    # Starts the Playwright engine asynchronously
-    playwright = await async_playwright().start()
-    # Runs Chromium in headless mode (no display required — needed in dev containers / servers without an X server)
-    browser = await playwright.chromium.launch(headless=True)
-    # Wraps the browser in a LangChain toolkit so LLMs can interact with it using tools that perform browser actions like clicking, typing, and navigating pages
-    toolkit = PlayWrightBrowserToolkit.from_browser(async_browser=browser)
+async def playwright_tools() -> tuple[list[Tool], BrowserLease]:
+    # Leases an isolated browser context from the process-wide pool of warm headless Chromium browsers
+    lease = await get_browser_pool().lease()
+    # Wraps the leased context in a LangChain toolkit so LLMs can interact with it using tools that perform browser actions like clicking, typing, and navigating pages
+    toolkit = PlayWrightBrowserToolkit.from_browser(async_browser=lease.browser)
     return (
         toolkit.get_tools(),
-        browser,
-        playwright,
+        lease,
     )
 
 
 def push(text: str):
     """Send a push notification to the user"""
-    requests.post(
-        settings.pushover_api,
-        data={
-            "token": settings.pushover_token,
-            "user": settings.pushover_user,
-            "message": text,
-        },
-    )
+    # Queued for the shared background sender, so the agent never waits on the Pushover API
+    notify(text)
     return "success"
 
 
@@ -78,12 +68,18 @@ async def other_tools() -> list[Tool]:
         func=serper.run,
         description="Use this tool when you want to get the results of an online web search",  # Wraps Google search as a LangChain tool
     )
+    # Evaluator retries re-issue the same searches, so answer repeats from the cache
+    tool_search = cached_tool(tool_search, ttl=settings.tool_cache_search_ttl, fold_text=True)
 
     # Creates the low-level Wikipedia API wrapper
     wikipedia = WikipediaAPIWrapper()
     # Creates a Wikipedia search tool for the LLM to use, which uses the WikipediaAPIWrapper to fetch and return Wikipedia articles based on search queries
-    wiki_tool = WikipediaQueryRun(api_wrapper=wikipedia)
-    python_repl = PythonREPLTool()
+    wiki_tool = cached_tool(
+        WikipediaQueryRun(api_wrapper=wikipedia), ttl=settings.tool_cache_wikipedia_ttl, fold_text=True
+    )
+    # Runs LLM-written code in warm, resource-limited worker processes instead of the server process
+    # (the first call starts the pool, so wait for its workers off the event loop)
+    python_repl = python_sandbox_tool(await asyncio.to_thread(get_sandbox_pool))
 
     return file_tools + [
         push_tool,
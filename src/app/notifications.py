@@ -0,0 +1,295 @@
+import asyncio
+import atexit
+import json
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+from src.app.settings import get_settings
+
+settings = get_settings()
+
+# Pushover rejects messages longer than this
+MAX_MESSAGE_LENGTH = 1024
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class NotificationError(Exception):
+    def __init__(self, message: str, retryable: bool, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class PushoverClient:
+    """Pushover API client over keep-alive connection pools, with retries using exponential backoff and full jitter"""
+
+    def __init__(
+        self,
+        api_url: str,
+        token: str,
+        user: str,
+        timeout: float = 10.0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.api_url = api_url
+        self.token = token
+        self.user = user
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=10, max_keepalive_connections=5)
+        self.client = httpx.Client(timeout=timeout, limits=self.limits)
+        # Created on the first async send, as its connections belong to the event loop that uses them
+        self.async_client: Optional[httpx.AsyncClient] = None
+
+    def payload(self, message: str) -> dict[str, str]:
+        return {"token": self.token, "user": self.user, "message": message}
+
+    def check(self, response: httpx.Response) -> None:
+        if response.status_code == 200:
+            return
+        retry_after = response.headers.get("Retry-After")
+        raise NotificationError(
+            f"Pushover returned {response.status_code}: {response.text[:200]}",
+            retryable=response.status_code in RETRYABLE_STATUS,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        if isinstance(error, NotificationError) and error.retry_after is not None:
+            return error.retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def send_once(self, message: str) -> None:
+        try:
+            response = self.client.post(self.api_url, data=self.payload(message))
+        except httpx.HTTPError as e:
+            raise NotificationError(repr(e), retryable=True) from e
+        self.check(response)
+
+    async def asend_once(self, message: str) -> None:
+        try:
+            if self.async_client is None:
+                self.async_client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            response = await self.async_client.post(self.api_url, data=self.payload(message))
+        except httpx.HTTPError as e:
+            raise NotificationError(repr(e), retryable=True) from e
+        self.check(response)
+
+    def send(self, message: str) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.send_once(message)
+            except NotificationError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt, e))
+
+    async def asend(self, message: str) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.asend_once(message)
+            except NotificationError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff(attempt, e))
+
+    def close(self) -> None:
+        """Close the connection pools; a client used with asend should be closed with aclose on its event loop"""
+        self.client.close()
+        if self.async_client is not None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # No loop running here (e.g. at exit), so close the async pool on a loop of its own
+                asyncio.run(self.async_client.aclose())
+            else:
+                asyncio.get_running_loop().create_task(self.async_client.aclose())
+            self.async_client = None
+
+    async def aclose(self) -> None:
+        self.client.close()
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+
+
+def batch_messages(messages: list[str], limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Join messages into as few newline-separated batches of at most limit characters as possible"""
+    batches, current = [], ""
+    for message in messages:
+        # A single oversized message is split on its own
+        for start in range(0, max(len(message), 1), limit):
+            part = message[start : start + limit]
+            if current and len(current) + 1 + len(part) <= limit:
+                current += "\n" + part
+            else:
+                if current:
+                    batches.append(current)
+                current = part
+    if current:
+        batches.append(current)
+    return batches
+
+
+class Notifier:
+    """Background sender: notify() only enqueues, a daemon thread coalesces bursts and delivers them
+
+    Messages arriving within batch_window seconds of each other go out as one push.
+    Batches that still fail after the client's retries are appended to a JSON-lines dead-letter file.
+    """
+
+    def __init__(
+        self,
+        client: PushoverClient,
+        batch_window: float = 2.0,
+        max_queue: int = 1000,
+        dead_letter_path: str = "notifications_dead_letter.jsonl",
+    ):
+        self.client = client
+        self.batch_window = batch_window
+        self.dead_letter_path = dead_letter_path
+        self.queue: queue.Queue[Optional[str]] = queue.Queue(maxsize=max_queue)
+        self.dead_letter_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self.run, name="notifier", daemon=True)
+        self.thread.start()
+
+    def notify(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dead_letter(message, "notification queue full")
+
+    def collect(self) -> tuple[list[str], bool]:
+        """Block for the first message, then gather whatever else arrives within the batch window"""
+        first = self.queue.get()
+        if first is None:
+            return [], True
+        messages = [first]
+        deadline = time.monotonic() + self.batch_window
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                message = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if message is None:
+                return messages, True
+            messages.append(message)
+        return messages, False
+
+    def run(self) -> None:
+        stopping = False
+        while not stopping:
+            messages, stopping = self.collect()
+            for batch in batch_messages(messages):
+                try:
+                    self.client.send(batch)
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Failed to send notification: {e}")
+                    self.dead_letter(batch, str(e))
+
+    def dead_letter(self, message: str, error: str) -> None:
+        record = {"time": datetime.now(timezone.utc).isoformat(), "error": error, "message": message}
+        with self.dead_letter_lock, open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush what is queued (bounded by timeout) and stop the sender thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+        self.client.close()
+
+
+@lru_cache()
+def get_notifier() -> Notifier:
+    """Get the process-wide notifier shared by every push tool"""
+    client = PushoverClient(
+        api_url=settings.pushover_api,
+        token=settings.pushover_token,
+        user=settings.pushover_user,
+        timeout=settings.notification_timeout,
+        max_retries=settings.notification_max_retries,
+        backoff_base=settings.notification_backoff_base,
+        backoff_max=settings.notification_backoff_max,
+    )
+    notifier = Notifier(
+        client,
+        batch_window=settings.notification_batch_window,
+        max_queue=settings.notification_max_queue,
+        dead_letter_path=settings.notification_dead_letter_path,
+    )
+    # Deliver what is still queued when the process exits normally
+    atexit.register(notifier.close)
+    return notifier
+
+
+def notify(message: str) -> None:
+    """Queue a push notification to the user; returns immediately"""
+    get_notifier().notify(message)
+
+
+class LocalPushoverServer:
+    """A local stand-in for the Pushover API, for exercising the client without sending real pushes
+
+    Records every message it receives, and answers the first fail_first requests with fail_status.
+    Point settings.pushover_api (PUSHOVER_API) or a PushoverClient at its url.
+    """
+
+    def __init__(self, fail_first: int = 0, fail_status: int = 503, port: int = 0):
+        self.messages: list[str] = []
+        self.requests = 0
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                server.requests += 1
+                if server.requests <= server.fail_first:
+                    status, reply = server.fail_status, {"status": 0, "errors": ["simulated failure"]}
+                else:
+                    server.messages.append(parse_qs(body).get("message", [""])[0])
+                    status, reply = 200, {"status": 1, "request": str(server.requests)}
+                content = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/1/messages.json"
+
+    def __enter__(self) -> "LocalPushoverServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -10,10 +10,101 @@ class Settings(BaseSettings):
     pushover_user: str = ""
     pushover_token: str = ""
     pushover_api: str = "https://api.pushover.net/1/messages.json"
+    notification_batch_window: float = 2.0
+    notification_timeout: float = 10.0
+    notification_max_retries: int = 5
+    notification_backoff_base: float = 0.5
+    notification_backoff_max: float = 30.0
+    notification_max_queue: int = 1000
+    notification_dead_letter_path: str = "notifications_dead_letter.jsonl"
     langsmith_tracing: str = ""
     langsmith_endpoint: str = ""
     langsmith_api_key: str = ""
     langsmith_project: str = ""
+    browser_pool_max_browsers: int = 2
+    browser_pool_max_contexts: int = 10
+    browser_pool_warm_browsers: int = 1
+    browser_pool_idle_timeout: float = 300.0
+    sidekick_checkpointer: str = "memory"  # "memory" or "sqlite"
+    sidekick_checkpoint_db: str = "sidekick_checkpoints.sqlite"
+    sidekick_checkpoint_keep_last: int = 20
+    sidekick_checkpoint_max_threads: int = 500
+    sidekick_checkpoint_prune_interval: float = 60.0
+    sidekick_worker_max_tokens: int = 12000
+    sidekick_evaluator_max_tokens: int = 4000
+    sidekick_tool_timeout: float = 60.0
+    sidekick_tool_threads: int = 8
+    sidekick_browser_concurrency: int = 1
+    sidekick_max_sessions: int = 20  # each holds a browser context, so keep within the browser pool's capacity
+    sidekick_max_sessions_per_user: int = 3
+    sidekick_max_concurrent_supersteps: int = 8
+    sidekick_max_queued_supersteps: int = 50
+    sidekick_idle_timeout: float = 1800.0
+    sidekick_reap_interval: float = 60.0
+    sidekick_drain_timeout: float = 30.0
+    tool_cache_path: str = "tool_cache.sqlite"
+    tool_cache_max_entries: int = 1024
+    tool_cache_search_ttl: float = 3600.0
+    tool_cache_wikipedia_ttl: float = 86400.0
+    research_how_many_searches: int = 5
+    research_search_concurrency: int = 5
+    research_search_timeout: float = 90.0
+    research_search_retries: int = 2
+    research_search_backoff: float = 1.0
+    research_pipelined: bool = False  # draft before the searches finish; pays off when some searches straggle
+    research_draft_after: int = 3  # summaries to wait for before the writer starts drafting
+    research_adaptive: bool = False
+    research_max_searches: int = 20  # upper bound on the ranked plan of the adaptive mode
+    research_min_searches: int = 3
+    research_novelty_threshold: float = 0.1
+    research_novelty_patience: int = 2
+    research_budget_tokens: int = 0  # 0 means no limit
+    research_budget_dollars: float = 0.0  # 0 means no limit
+    openai_input_cost_per_million: float = 0.15
+    openai_output_cost_per_million: float = 0.60
+    web_search_call_cost: float = 0.025
+    research_requests_per_minute: int = 500
+    research_tokens_per_minute: int = 200000
+    research_expected_output_tokens: int = 1000
+    research_batch_concurrency: int = 4
+    research_batch_query_timeout: float = 1800.0
+    research_spans_path: str = "research_spans.jsonl"  # empty disables the span export
+    guardrail_cache_max_entries: int = 1024
+    agent_tool_concurrency: int = 8  # nested agent runs at once, shared by every manager run
+    agent_tool_max_output_chars: int = 4000
+    best_of_n_deadline: float = 0.0  # seconds; 0 waits for every candidate
+    extraction_max_repairs: int = 2
+    extraction_concurrency: int = 8
+    profile_cache_dir: str = ".cache/profile"
+    profile_chat_max_sessions: int = 10000  # least recently used sessions are evicted beyond this
+    profile_chat_session_ttl: float = 3600.0  # seconds of inactivity before a session is dropped
+    profile_chat_max_history: int = 40  # messages kept per session
+    profile_chat_max_tool_rounds: int = 5
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    smtp_host: str = ""  # empty means dry run: emails are printed instead of sent
+    smtp_port: int = 587
+    smtp_username: str = ""
+    smtp_password: str = ""
+    smtp_starttls: bool = True
+    smtp_idle_timeout: float = 60.0
+    email_from: str = ""
+    email_to: str = ""
+    email_batch_window: float = 2.0
+    email_max_batch: int = 50
+    research_cache_enabled: bool = True
+    research_cache_max_entries: int = 2000
+    research_plan_cache_threshold: float = 0.96  # also needs the same numbers and names in both queries
+    research_plan_cache_ttl: float = 86400.0
+    research_summary_cache_threshold: float = 0.95
+    research_summary_cache_ttl: float = 21600.0
+    python_sandbox_workers: int = 2
+    python_sandbox_max_executions: int = 50
+    python_sandbox_timeout: float = 30.0
+    python_sandbox_cpu_seconds: int = 10
+    python_sandbox_memory_mb: int = 1024  # 0 disables the address-space limit
+    python_sandbox_max_output: int = 10000
+    python_sandbox_acquire_timeout: float = 60.0  # seconds a call waits for a free worker before failing
 
     model_config = ConfigDict(env_file=".env", case_sensitive=False, extra="ignore")
 